@@ -359,9 +359,10 @@ class BaseAttack(metaclass=abc.ABCMeta):
                       + "\n Cannot continue attack generation.\033[0m")
                 sys.exit(-1)
 
-    def write_attack_pcap(self, packets: list, append_flag: bool = False, destination_path: str = None):
+    def write_attack_pcap(self, packets: t.Iterable, append_flag: bool = False, destination_path: str = None):
         """
-        Writes the attack's packets into a PCAP file with a temporary filename.
+        Writes the attack's packets into a PCAP file with a temporary filename. The packets may be given by any
+        iterable, e.g. a generator, which is consumed one packet at a time.
 
         :return: The path of the written PCAP file.
         """
@@ -396,38 +397,68 @@ class BaseAttack(metaclass=abc.ABCMeta):
         :param mode: either "local" or "public"
         :return minimum and maximum latency
         """
-        if not mode:
-            mode = Util.get_network_mode(ip_src, ip_dst)
-        minimum = {"local": 900, "public": 3000}
+        return self.get_reply_latency_bulk(ip_src, [ip_dst], default, mode)[ip_dst]
 
-        if default != 0:
-            minimum[mode] = default
-
-        result = self.statistics.process_db_query\
-                ("SELECT minLatency, maxLatency FROM ip_statistics WHERE ipAddress in ('{0}, {1}');".
-                 format(ip_src, ip_dst))
-
-        min_latency = minimum[mode]
-        max_latency = minimum[mode]
-
-        for ip in result:
-            # retrieve minimum latency
-            if ip[0]:
-                retrieved = ip[0]
-            else:
-                retrieved = np.median(self.all_min_latencies)
-            min_latency = min(min_latency, retrieved)
+    def get_reply_latency_bulk(self, ip_src, ip_dsts: list, default: int=0, mode: str=None) -> dict:
+        """
+        Gets the minimum and the maximum reply latency for the connections of a source IP to several destination IPs,
+        using a single database query.
 
-            # retrieve maximum latency
-            if ip[1]:
-                retrieved = ip[1]
-            else:
-                retrieved = np.median(self.all_max_latencies)
-            max_latency = min(max_latency, retrieved)
+        :param ip_src: The source IP for which to retrieve the reply latency.
+        :param ip_dsts: The destination IPs for which to retrieve the reply latency.
+        :param default: The default value to return if no latency could be calculated.
+        :param mode: either "local" or "public", determined per destination if not given
+        :return a dict mapping each destination IP to its minimum and maximum latency
+        """
+        result = self.statistics.get_ip_rows("ipAddress, minLatency, maxLatency", "ip_statistics",
+                                             [ip_src] + list(ip_dsts))
+        latencies = {row[0]: row[1:] for row in result}
+        # IPs with too few packets have latencies of 0, these are replaced by the median latency of all conversations,
+        # if there are any (the conversations of small captures may be too short to have a latency)
+        median_min_latency, median_max_latency = None, None
+        if isinstance(self.all_min_latencies, list) and self.all_min_latencies:
+            median_min_latency = np.median(self.all_min_latencies)
+        if isinstance(self.all_max_latencies, list) and self.all_max_latencies:
+            median_max_latency = np.median(self.all_max_latencies)
+
+        latency_map = {}
+        for ip_dst in ip_dsts:
+            dst_mode = mode
+            if not dst_mode:
+                dst_mode = Util.get_network_mode(ip_src, ip_dst)
+            minimum = {"local": 900, "public": 3000}
+
+            if default != 0:
+                minimum[dst_mode] = default
+
+            min_latency = minimum[dst_mode]
+            max_latency = minimum[dst_mode]
+
+            for ip in {ip_src, ip_dst}:
+                if ip not in latencies:
+                    continue
+                # retrieve minimum latency
+                if latencies[ip][0]:
+                    retrieved = latencies[ip][0]
+                elif median_min_latency is not None:
+                    retrieved = median_min_latency
+                else:
+                    retrieved = minimum[dst_mode]
+                min_latency = min(min_latency, retrieved)
+
+                # retrieve maximum latency
+                if latencies[ip][1]:
+                    retrieved = latencies[ip][1]
+                elif median_max_latency is not None:
+                    retrieved = median_max_latency
+                else:
+                    retrieved = minimum[dst_mode]
+                max_latency = min(max_latency, retrieved)
 
-        min_latency = int(min_latency) * 10 ** -6  # convert from micro to seconds
-        max_latency = int(max_latency) * 10 ** -6
-        return min_latency, max_latency
+            min_latency = int(min_latency) * 10 ** -6  # convert from micro to seconds
+            max_latency = int(max_latency) * 10 ** -6
+            latency_map[ip_dst] = (min_latency, max_latency)
+        return latency_map
 
     def get_intermediate_timestamp(self, divisor: int=2, factor: int=1) -> int:
         """
@@ -654,8 +685,31 @@ class BaseAttack(metaclass=abc.ABCMeta):
         :param ip_address: the ip of which (packet-)data shall be returned
         :return: MSS, TTL and Window Size values of the given IP
         """
+        return self._sample_ip_data(self.statistics.get_mss_distribution(ip_address),
+                                    self.statistics.get_ttl_distribution(ip_address),
+                                    self.statistics.get_win_distribution(ip_address))
+
+    def get_ip_data_bulk(self, ip_addresses: list) -> dict:
+        """
+        Retrieves the (packet-)data of several IPs, using a single database query per distribution.
+
+        :param ip_addresses: the ips of which (packet-)data shall be returned
+        :return: a dict mapping each IP to its MSS, TTL and Window Size values
+        """
+        mss_dists = self.statistics.get_mss_distributions(ip_addresses)
+        ttl_dists = self.statistics.get_ttl_distributions(ip_addresses)
+        win_dists = self.statistics.get_win_distributions(ip_addresses)
+        return {ip: self._sample_ip_data(mss_dists.get(ip, {}), ttl_dists.get(ip, {}), win_dists.get(ip, {}))
+                for ip in ip_addresses}
+
+    def _sample_ip_data(self, mss_dist: dict, ttl_dist: dict, win_dist: dict):
+        """
+        :param mss_dist: the MSS distribution of an IP
+        :param ttl_dist: the TTL distribution of an IP
+        :param win_dist: the Window Size distribution of an IP
+        :return: MSS, TTL and Window Size values drawn from the given distributions
+        """
         # Set MSS (Maximum Segment Size) based on MSS distribution of IP address
-        mss_dist = self.statistics.get_mss_distribution(ip_address)
         if len(mss_dist) > 0:
             mss_prob_dict = lea.Lea.fromValFreqsDict(mss_dist)
             mss_value = mss_prob_dict.random()
@@ -663,7 +717,6 @@ class BaseAttack(metaclass=abc.ABCMeta):
             mss_value = Util.handle_most_used_outputs(self.most_used_mss_value)
 
         # Set TTL based on TTL distribution of IP address
-        ttl_dist = self.statistics.get_ttl_distribution(ip_address)
         if len(ttl_dist) > 0:
             ttl_prob_dict = lea.Lea.fromValFreqsDict(ttl_dist)
             ttl_value = ttl_prob_dict.random()
@@ -671,7 +724,6 @@ class BaseAttack(metaclass=abc.ABCMeta):
             ttl_value = Util.handle_most_used_outputs(self.most_used_ttl_value)
 
         # Set Window Size based on Window Size distribution of IP address
-        win_dist = self.statistics.get_win_distribution(ip_address)
         if len(win_dist) > 0:
             win_prob_dict = lea.Lea.fromValFreqsDict(win_dist)
             win_value = win_prob_dict.random()
@@ -28,6 +28,7 @@ class P2PBotnet(BaseAttack.BaseAttack):
     NUMBER_INITIATOR_BOTS = 'bots.count'
     FILE_CSV = 'file.csv'
     FILE_XML = 'file.xml'
+    FILE_XML_PERSIST = 'file.xml.persist'
     IP_REUSE_TOTAL = 'ip.reuse.total'
     IP_REUSE_LOCAL = 'ip.reuse.local'
     IP_REUSE_EXTERNAL = 'ip.reuse.external'
@@ -63,6 +64,8 @@ class P2PBotnet(BaseAttack.BaseAttack):
             # input file containing botnet communication
             Parameter(self.FILE_CSV, FilePath()),
             Parameter(self.FILE_XML, FilePath()),
+            # whether a CSV input file is additionally stored as XML file in the output directory
+            Parameter(self.FILE_XML_PERSIST, Boolean()),
 
             # the percentage of IP reuse (if total and other is specified, percentages are multiplied)
             Parameter(self.IP_REUSE_TOTAL, Percentage()),
@@ -116,6 +119,9 @@ class P2PBotnet(BaseAttack.BaseAttack):
             value = self.statistics.get_rnd_packet_index(divisor=5)
         elif param == self.FILE_XML:
             value = self.DEFAULT_XML_PATH
+        # only convert a CSV input to XML on request
+        elif param == self.FILE_XML_PERSIST:
+            value = False
         # Alternatively new attack parameter?
         elif param == self.ATTACK_DURATION:
             value = int(float(self.statistics.get_capture_duration()))
@@ -478,11 +484,13 @@ class P2PBotnet(BaseAttack.BaseAttack):
             cpp_comm_proc.parse_csv(filepath_csv)
             if print_updates:
                 print("done.")
-                print("Writing corresponding XML file...", end=" ")
-                sys.stdout.flush()
-            filepath_xml = cpp_comm_proc.write_xml(Util.OUT_DIR, filename)
-            if print_updates:
-                print("done.")
+            if self.get_param_value(self.FILE_XML_PERSIST):
+                if print_updates:
+                    print("Writing corresponding XML file...", end=" ")
+                    sys.stdout.flush()
+                cpp_comm_proc.write_xml(Util.OUT_DIR, filename)
+                if print_updates:
+                    print("done.")
         else:
             filesize = os.path.getsize(filepath_xml) / 2**20  # get filesize in MB
             if filesize > 10:
@@ -529,16 +537,15 @@ class P2PBotnet(BaseAttack.BaseAttack):
         mapped_ids = comm_interval["IDs"]
         packet_start_idx = comm_interval["Start"]
         packet_end_idx = comm_interval["End"]
-        while len(mapped_ids) > number_init_bots:
-            rm_idx = rnd.randrange(0, len(mapped_ids))
-            del mapped_ids[rm_idx]
+        if len(mapped_ids) > number_init_bots:
+            mapped_ids = rnd.sample(mapped_ids, number_init_bots)
 
         if print_updates:
             print("Generating attack packets...", end=" ")
         sys.stdout.flush()
         # get the messages contained in the chosen interval
-        abstract_packets = cpp_comm_proc.get_messages(packet_start_idx, packet_end_idx)
-        comm_proc.set_mapping(abstract_packets, mapped_ids)
+        abstract_packets = cpp_comm_proc.get_message_columns(packet_start_idx, packet_end_idx)
+        comm_proc.set_mapping_columns(abstract_packets, mapped_ids)
         # determine ID roles and select the messages that are to be mapped into the PCAP
         messages = comm_proc.det_id_roles_and_msgs()
         # use the previously detetermined roles to assign the locality of all IDs
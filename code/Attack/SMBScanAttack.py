@@ -1,12 +1,20 @@
+import concurrent.futures
+import functools
+import heapq
+import itertools
 import logging
+import operator
+import os
 import random as rnd
+import struct
 import time
 
+import numpy as np
 import scapy.layers.inet as inet
-from scapy.layers.smb import *
+from scapy.compat import raw
+from scapy.packet import Raw
 
 import Attack.BaseAttack as BaseAttack
-import Lib.SMB2 as SMB2
 import Lib.SMBLib as SMBLib
 import Lib.Utility as Util
 
@@ -15,6 +23,227 @@ from Attack.Parameter import Parameter, Boolean, Float, IntegerPositive, IPAddre
 
 logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
 
+# minimum number of targets for which the packets are built in worker processes
+_PARALLEL_MIN_TARGETS = 64
+
+# offsets of the connection specific fields in the serialized SMB Negotiate Protocol Responses
+_SMB2_RSP_GUID_OFFSET = 72
+_SMB2_RSP_TIME_OFFSET = 104
+_SMB_RSP_PID_OFFSET = 26
+_SMB_RSP_MID_OFFSET = 30
+
+
+@functools.lru_cache(maxsize=None)
+def _build_tcp_templates() -> dict:
+    """
+    Builds one Ether/IP/TCP template packet for each TCP flag combination used by the SMB scan. Copying a template and
+    patching its fields is considerably cheaper than constructing all layers from scratch for every packet. The
+    templates are built once per process and must not be modified.
+
+    :return: a dict mapping the TCP flags to the corresponding template packet
+    """
+    templates = {}
+    for flags in ['S', 'SA', 'A', 'FA', 'RA']:
+        templates[flags] = inet.Ether() / inet.IP(flags='DF') / inet.TCP(flags=flags)
+    # the packets carrying the SMB negotiation are sent without the don't fragment flag
+    templates['PA'] = inet.Ether() / inet.IP() / inet.TCP(flags='PA')
+    return templates
+
+
+def _tcp_from_template(template, mac_src: str, mac_dst: str, ip_src: str, ip_dst: str, ttl: int, sport: int,
+                       dport: int, seq: int, ack: int, window: int=None, options: list=None):
+    """
+    Creates a new TCP packet by copying the given template and setting the connection specific fields.
+
+    :param template: the template packet, as returned by _build_tcp_templates
+    :param mac_src: the source MAC address
+    :param mac_dst: the destination MAC address
+    :param ip_src: the source IP address
+    :param ip_dst: the destination IP address
+    :param ttl: the TTL value of the IP layer
+    :param sport: the TCP source port
+    :param dport: the TCP destination port
+    :param seq: the TCP sequence number
+    :param ack: the TCP acknowledgement number
+    :param window: the TCP window size, the template's default if None
+    :param options: the TCP options, if any
+    :return: the new packet
+    """
+    packet = template.copy()
+    packet.src = mac_src
+    packet.dst = mac_dst
+    ip_layer = packet.payload
+    ip_layer.src = ip_src
+    ip_layer.dst = ip_dst
+    ip_layer.ttl = ttl
+    tcp_layer = ip_layer.payload
+    tcp_layer.sport = sport
+    tcp_layer.dport = dport
+    tcp_layer.seq = seq
+    tcp_layer.ack = ack
+    if window is not None:
+        tcp_layer.window = window
+    if options is not None:
+        tcp_layer.options = options
+    return packet
+
+
+@functools.lru_cache(maxsize=None)
+def _build_smb_response_template(smb2: bool, security_blob, capabilities: int, data_size: int) -> bytes:
+    """
+    Serializes an SMB Negotiate Protocol Response with all fields, which do not depend on the connection. For SMB 2 the
+    server GUID and the system and server start times, for SMB 1 the process and multiplex IDs are left at zero and have
+    to be patched at the _SMB*_RSP_*_OFFSET offsets.
+
+    :param smb2: True for an SMB 2 response, False for an SMB 1 response
+    :param security_blob: the security blob of the hosting platform
+    :param capabilities: the SMB 2 capabilities of the hosting platform
+    :param data_size: the SMB 2 maximum transaction, read and write size of the hosting platform
+    :return: the serialized SMB header and response
+    """
+    from scapy.layers.smb import SMBNegociate_Protocol_Response_Advanced_Security
+    import Lib.SMB2 as SMB2
+
+    if smb2:
+        smb_rsp_packet = SMB2.SMB2_SYNC_Header(Flags=1) /\
+            SMB2.SMB2_Negotiate_Protocol_Response(DialectRevision=0x02ff, SecurityBufferOffset=124,
+                                                  SecurityBufferLength=len(security_blob), SecurityBlob=security_blob,
+                                                  Capabilities=capabilities, MaxTransactSize=data_size,
+                                                  MaxReadSize=data_size, MaxWriteSize=data_size)
+    else:
+        smb_rsp_packet = SMBNegociate_Protocol_Response_Advanced_Security(Start="\xffSMB", PID=0, MID=0,
+                                                                          DialectIndex=5, SecurityBlob=security_blob)
+    return raw(smb_rsp_packet)
+
+
+def _build_target_packets(common: dict, target: dict) -> list:
+    """
+    Builds all packets of the SMB scan against a single target. All random values and timestamps have to be drawn
+    beforehand, which keeps this function free of side effects, so it can be run in a worker process.
+
+    :param common: the target independent parameters of the scan, e.g. the attacker's addresses and the serialized
+    SMB request tails
+    :param target: the parameters of a single target, including the timestamps of all packets in sending order
+    :return: the packets of the target in sending order
+    """
+    from scapy.layers.netbios import NBTSession
+    from scapy.layers.smb import SMBNegociate_Protocol_Request_Header
+
+    tcp_templates = _build_tcp_templates()
+    mac_source, ip_source = common['mac_source'], common['ip_source']
+    source_mss_value, source_ttl_value, source_win_value = common['source_ip_data']
+    ip, mac_destination = target['ip'], target['mac_destination']
+    destination_mss_value, destination_ttl_value, destination_win_value = target['destination_ip_data']
+    sport = target['sport']
+    attacker_seq, victim_seq = target['seqs']
+    smb_port = SMBLib.smb_port
+
+    packets = []
+
+    # 1) Build request package
+    request = _tcp_from_template(tcp_templates['S'], mac_source, mac_destination, ip_source, ip, source_ttl_value,
+                                 sport, smb_port, attacker_seq, 0, source_win_value, [('MSS', source_mss_value)])
+    attacker_seq += 1
+    packets.append(request)
+
+    if target['hosting']:
+
+        # 2) Build TCP packages for ip that hosts SMB
+
+        # destination sends SYN, ACK
+        reply = _tcp_from_template(tcp_templates['SA'], mac_destination, mac_source, ip, ip_source,
+                                   destination_ttl_value, smb_port, sport, victim_seq, attacker_seq,
+                                   destination_win_value, [('MSS', destination_mss_value)])
+        victim_seq += 1
+        packets.append(reply)
+
+        # requester confirms, ACK
+        confirm = _tcp_from_template(tcp_templates['A'], mac_source, mac_destination, ip_source, ip, source_ttl_value,
+                                     sport, smb_port, attacker_seq, victim_seq, source_win_value)
+        packets.append(confirm)
+
+        # 3) Build SMB Negotiation packets
+        smb_mid, smb_pid = target['smb_ids']
+
+        # Creation of SMB Negotiate Protocol Request packet
+        smb_req_tail_size = common['smb_req_tail_size']
+        smb_req_head = SMBNegociate_Protocol_Request_Header(Flags2=0x2801, PID=smb_pid, MID=smb_mid,
+                                                            ByteCount=smb_req_tail_size)
+        smb_req_length = common['smb_req_head_len'] + smb_req_tail_size
+        smb_req_net_bio = NBTSession(TYPE=0x00, LENGTH=smb_req_length)
+        smb_req_tcp = _tcp_from_template(tcp_templates['PA'], mac_source, mac_destination, ip_source, ip,
+                                         source_ttl_value, sport, smb_port, attacker_seq, victim_seq)
+        attacker_seq += common['nbt_hdr_len'] + smb_req_length
+
+        # the dialect tails are attached as one pre-serialized payload
+        smb_req_combined = (smb_req_tcp / smb_req_net_bio / smb_req_head /
+                            Raw(load=common['smb_req_tails_raw']))
+        packets.append(smb_req_combined)
+
+        # destination confirms SMB request package
+        confirm_smb_req = _tcp_from_template(tcp_templates['A'], mac_destination, mac_source, ip, ip_source,
+                                             destination_ttl_value, smb_port, sport, victim_seq, attacker_seq,
+                                             destination_win_value)
+        packets.append(confirm_smb_req)
+
+        # smb response package
+        server_guid, security_blob, capabilities, data_size, server_start_time = target['smb_platform_data']
+        system_time = target['system_time']
+
+        # Creation of SMB Negotiate Protocol Response packets, only the connection specific fields are patched into a
+        # copy of the serialized template
+        smb_rsp = bytearray(_build_smb_response_template(common['smb2'], security_blob, capabilities, data_size))
+        if common['smb2']:
+            struct.pack_into("<16s", smb_rsp, _SMB2_RSP_GUID_OFFSET, server_guid.encode())
+            struct.pack_into("<QQ", smb_rsp, _SMB2_RSP_TIME_OFFSET, system_time, server_start_time)
+        else:
+            struct.pack_into("<H", smb_rsp, _SMB_RSP_PID_OFFSET, smb_pid)
+            struct.pack_into("<H", smb_rsp, _SMB_RSP_MID_OFFSET, smb_mid)
+        smb_rsp_length = len(smb_rsp)
+        smb_rsp_net_bio = NBTSession(TYPE=0x00, LENGTH=smb_rsp_length)
+        smb_rsp_tcp = _tcp_from_template(tcp_templates['PA'], mac_destination, mac_source, ip, ip_source,
+                                         destination_ttl_value, smb_port, sport, victim_seq, attacker_seq)
+        victim_seq += common['nbt_hdr_len'] + smb_rsp_length
+
+        smb_rsp_combined = (smb_rsp_tcp / smb_rsp_net_bio / Raw(load=bytes(smb_rsp)))
+        packets.append(smb_rsp_combined)
+
+        # source confirms SMB response package
+        confirm_smb_res = _tcp_from_template(tcp_templates['A'], mac_source, mac_destination, ip_source, ip,
+                                             source_ttl_value, sport, smb_port, attacker_seq, victim_seq,
+                                             source_win_value)
+        packets.append(confirm_smb_res)
+
+        # attacker sends FIN ACK
+        source_fin_ack = _tcp_from_template(tcp_templates['FA'], mac_source, mac_destination, ip_source, ip,
+                                            source_ttl_value, sport, smb_port, attacker_seq, victim_seq,
+                                            source_win_value)
+        attacker_seq += 1
+        packets.append(source_fin_ack)
+
+        # victim sends FIN ACK
+        destination_fin_ack = _tcp_from_template(tcp_templates['FA'], mac_destination, mac_source, ip, ip_source,
+                                                 destination_ttl_value, smb_port, sport, victim_seq, attacker_seq,
+                                                 destination_win_value)
+        victim_seq += 1
+        packets.append(destination_fin_ack)
+
+        # source sends final ACK
+        final_ack = _tcp_from_template(tcp_templates['A'], mac_source, mac_destination, ip_source, ip,
+                                       source_ttl_value, sport, smb_port, attacker_seq, victim_seq, source_win_value)
+        packets.append(final_ack)
+
+    else:
+        # Build RST package
+        reply = _tcp_from_template(tcp_templates['RA'], mac_destination, mac_source, ip, ip_source,
+                                   destination_ttl_value, smb_port, sport, 0, attacker_seq, destination_win_value,
+                                   [('MSS', destination_mss_value)])
+        packets.append(reply)
+
+    for packet, timestamp in zip(packets, target['timestamps']):
+        packet.time = timestamp
+    return packets
+
 # noinspection PyPep8
 
 
@@ -41,6 +270,8 @@ class SMBScanAttack(BaseAttack.BaseAttack):
                                             "Scanning/Probing")
 
         self.host_os = Util.get_rnd_os()
+        # indices of self.packets at which the packets of a new target begin
+        self.target_run_starts = []
 
         # Define allowed parameters and their type
         self.update_params([
@@ -114,12 +345,14 @@ class SMBScanAttack(BaseAttack.BaseAttack):
         """
         Creates the attack packets.
         """
+        # The SMB layers are only imported once the attack is actually generated
+        from scapy.layers.netbios import NBTSession
+        from scapy.layers.smb import SMBNegociate_Protocol_Request_Header, SMBNegociate_Protocol_Request_Tail
 
         # Timestamp
         timestamp_next_pkt = self.get_param_value(self.INJECT_AT_TIMESTAMP)
         # store start time of attack
         self.attack_start_utime = timestamp_next_pkt
-        timestamp_prv_reply, timestamp_confirm = 0, 0
 
         # Initialize parameters
         ip_source = self.get_param_value(self.IP_SOURCE)
@@ -146,7 +379,7 @@ class SMBScanAttack(BaseAttack.BaseAttack):
         ip_destinations = ip_destinations + rnd_ips
 
         # Make sure the source IP is not part of targets
-        if isinstance(ip_destinations, list) and ip_source in ip_destinations:
+        if ip_source in ip_destinations:
             ip_destinations.remove(ip_source)
         self.add_param_value(self.IP_DESTINATION, ip_destinations)
 
@@ -166,6 +399,7 @@ class SMBScanAttack(BaseAttack.BaseAttack):
 
         hosting_ip = hosting_ip + ip_destinations[:int(rnd_ip_count)]
         self.add_param_value(self.HOSTING_IP, hosting_ip)
+        hosting_ip_set = set(hosting_ip)
 
         # Shuffle targets
         rnd.shuffle(ip_destinations)
@@ -173,6 +407,7 @@ class SMBScanAttack(BaseAttack.BaseAttack):
         # FIXME: Handle mac addresses correctly
         mac_source = self.get_param_value(self.MAC_SOURCE)
         mac_dest = self.get_param_value(self.MAC_DESTINATION)
+        single_mac_dest = isinstance(mac_dest, str)
 
         # Check smb version
         smb_version = self.get_param_value(self.PROTOCOL_VERSION)
@@ -185,32 +420,28 @@ class SMBScanAttack(BaseAttack.BaseAttack):
         src_platform = self.get_param_value(self.SOURCE_PLATFORM).lower()
 
         # randomize source ports according to platform, if specified
-        if self.get_param_value(self.PORT_SOURCE_RANDOMIZE):
+        port_randomize = bool(self.get_param_value(self.PORT_SOURCE_RANDOMIZE))
+        if port_randomize:
             sport = Util.generate_source_port_from_platform(src_platform)
         else:
             sport = self.get_param_value(self.PORT_SOURCE)
 
         # No destination IP was specified, but a destination MAC was specified, generate IP that fits MAC
-        if isinstance(ip_destinations, list) and isinstance(mac_dest, str):
+        if single_mac_dest:
             ip_destinations = self.statistics.get_ip_address_from_mac(mac_dest)
             if len(ip_destinations) == 0:
                 ip_destinations = self.generate_random_ipv4_address("Unknown", 1)
             # Check ip.src == ip.dst
             self.ip_src_dst_catch_equal(ip_source, ip_destinations)
-
-        ip_dests = []
-        if isinstance(ip_destinations, list):
-            ip_dests = ip_destinations
-        else:
-            ip_dests.append(ip_destinations)
-
-        if isinstance(ip_dests, list):
-            rnd.shuffle(ip_dests)
+            if not isinstance(ip_destinations, list):
+                ip_destinations = [ip_destinations]
+        ip_dests = ip_destinations
 
         # Randomize source IP, if specified
         if self.get_param_value(self.IP_SOURCE_RANDOMIZE):
+            ip_dests_set = frozenset(ip_dests)
             ip_source = self.generate_random_ipv4_address("Unknown", 1)
-            while ip_source in ip_dests:
+            while ip_source in ip_dests_set:
                 ip_source = self.generate_random_ipv4_address("Unknown", 1)
             mac_source = self.statistics.get_mac_address(str(ip_source))
             if len(mac_source) == 0:
@@ -219,19 +450,55 @@ class SMBScanAttack(BaseAttack.BaseAttack):
         # Get MSS, TTL and Window size value for source IP
         source_mss_value, source_ttl_value, source_win_value = self.get_ip_data(ip_source)
 
+        # Prefetch the statistics of all destinations at once
         mac_dests = self.statistics.get_mac_addresses(ip_dests)
+        ip_data_map = self.get_ip_data_bulk(ip_dests)
+        reply_latency_map = self.get_reply_latency_bulk(ip_source, ip_dests)
         first_timestamp_smb = self.statistics.get_pcap_timestamp_start()[:19]
+        first_timestamp = time.mktime(time.strptime(first_timestamp_smb, "%Y-%m-%d %H:%M:%S"))
 
-        for ip in ip_dests:
+        # Serialize the SMB request tails and headers only once, they do not depend on the target
+        smb_tail_cache = [raw(SMBNegociate_Protocol_Request_Tail(BufferData=dia)) for dia in SMBLib.smb_dialects]
 
+        # select dialects based on smb version
+        if smb_version == "1":
+            smb_req_tails = smb_tail_cache[0:6]
+        else:
+            smb_req_tails = smb_tail_cache
+        if len(smb_req_tails) == 0:
+            smb_req_tails = [raw(SMBNegociate_Protocol_Request_Tail())]
+        smb_req_tails_raw = b"".join(smb_req_tails)
+        smb_req_tail_size = len(smb_req_tails_raw)
+        smb_req_head_len = len(raw(SMBNegociate_Protocol_Request_Header()))
+        nbt_hdr_len = len(raw(NBTSession()))
+
+        # Randomize source port for each connection if specified, every port is derived from its predecessor
+        sports = [sport] * len(ip_dests)
+        if port_randomize:
+            for i in range(len(ip_dests)):
+                sport = Util.generate_source_port_from_platform(src_platform, sport)
+                sports[i] = sport
+
+        # Draw the random TCP sequence numbers and SMB multiplex/process IDs for all connections at once
+        tcp_seqs = np.random.randint(1000, 50001, size=(len(ip_dests), 2))
+        smb_ids = np.random.randint(1, 65536, size=(len(ip_dests), 2))
+
+        common = {'mac_source': mac_source, 'ip_source': ip_source,
+                  'source_ip_data': (source_mss_value, source_ttl_value, source_win_value),
+                  'smb2': smb_version != "1" and hosting_version != "1", 'smb_req_tails_raw': smb_req_tails_raw,
+                  'smb_req_tail_size': smb_req_tail_size, 'smb_req_head_len': smb_req_head_len,
+                  'nbt_hdr_len': nbt_hdr_len}
+
+        # Draw all random values and timestamps in the order of the original sequential generation, so only the
+        # construction of the packets is left to _build_target_packets
+        targets = []
+        for i, ip in enumerate(ip_dests):
             if ip != ip_source:
 
                 # Get destination Mac Address
-                mac_destination = ""
-                if ip in mac_dests.keys():
-                    mac_destination = mac_dests[ip]
+                mac_destination = mac_dests.get(ip, "")
                 if len(mac_destination) == 0:
-                    if isinstance(mac_dest, str):
+                    if single_mac_dest:
                         ip_from_mac = self.statistics.get_ip_address_from_mac(mac_dest)
                         if len(ip_from_mac) != 0:
                             ip = ip_from_mac
@@ -241,204 +508,62 @@ class SMBScanAttack(BaseAttack.BaseAttack):
                         mac_destination = self.generate_random_mac_address()
 
                 # Get MSS, TTL and Window size value for destination IP
-                destination_mss_value, destination_ttl_value, destination_win_value = self.get_ip_data(ip)
-
-                min_delay, max_delay = self.get_reply_latency(ip_source, ip)
-
-                # New connection, new random TCP sequence numbers
-                attacker_seq = rnd.randint(1000, 50000)
-                victim_seq = rnd.randint(1000, 50000)
-
-                # Randomize source port for each connection if specified
-                if self.get_param_value(self.PORT_SOURCE_RANDOMIZE):
-                    sport = Util.generate_source_port_from_platform(src_platform, sport)
-
-                # 1) Build request package
-                request_ether = inet.Ether(src=mac_source, dst=mac_destination)
-                request_ip = inet.IP(src=ip_source, dst=ip, ttl=source_ttl_value, flags='DF')
-                request_tcp = inet.TCP(sport=sport, dport=SMBLib.smb_port, window=source_win_value, flags='S',
-                                       seq=attacker_seq, options=[('MSS', source_mss_value)])
-                attacker_seq += 1
-                request = (request_ether / request_ip / request_tcp)
-                request.time = timestamp_next_pkt
-
-                # Append request
-                self.add_packet(request, ip_source, ip)
-
-                # Update timestamp for next package
-                timestamp_reply = self.timestamp_controller.next_timestamp(min_delay)
-
-                if ip in hosting_ip:
-
-                    # 2) Build TCP packages for ip that hosts SMB
-
-                    # destination sends SYN, ACK
-                    reply_ether = inet.Ether(src=mac_destination, dst=mac_source)
-                    reply_ip = inet.IP(src=ip, dst=ip_source, ttl=destination_ttl_value, flags='DF')
-                    reply_tcp = inet.TCP(sport=SMBLib.smb_port, dport=sport, seq=victim_seq, ack=attacker_seq,
-                                         flags='SA',
-                                         window=destination_win_value, options=[('MSS', destination_mss_value)])
-                    victim_seq += 1
-                    reply = (reply_ether / reply_ip / reply_tcp)
-                    reply.time = timestamp_reply
-                    self.add_packet(reply, ip_source, ip)
-
-                    # requester confirms, ACK
-                    confirm_ether = request_ether
-                    confirm_ip = request_ip
-                    confirm_tcp = inet.TCP(sport=sport, dport=SMBLib.smb_port, seq=attacker_seq, ack=victim_seq,
-                                           window=source_win_value, flags='A')
-                    confirm = (confirm_ether / confirm_ip / confirm_tcp)
-                    self.timestamp_controller.set_timestamp(timestamp_reply)
-                    timestamp_confirm = self.timestamp_controller.next_timestamp(min_delay)
-                    confirm.time = timestamp_confirm
-                    self.add_packet(confirm, ip_source, ip)
-
-                    # 3) Build SMB Negotiation packets
-                    smb_mid = rnd.randint(1, 65535)
-                    smb_pid = rnd.randint(1, 65535)
-                    smb_req_tail_arr = []
-                    smb_req_tail_size = 0
-
-                    # select dialects based on smb version
-                    if smb_version == "1":
-                        smb_req_dialects = SMBLib.smb_dialects[0:6]
-                    else:
-                        smb_req_dialects = SMBLib.smb_dialects
-                    if len(smb_req_dialects) == 0:
-                        smb_req_tail_arr.append(SMBNegociate_Protocol_Request_Tail())
-                        smb_req_tail_size = len(SMBNegociate_Protocol_Request_Tail())
-                    else:
-                        for dia in smb_req_dialects:
-                            smb_req_tail_arr.append(SMBNegociate_Protocol_Request_Tail(BufferData=dia))
-                            smb_req_tail_size += len(SMBNegociate_Protocol_Request_Tail(BufferData=dia))
-
-                    # Creation of SMB Negotiate Protocol Request packet
-                    smb_req_head = SMBNegociate_Protocol_Request_Header(Flags2=0x2801, PID=smb_pid, MID=smb_mid,
-                                                                        ByteCount=smb_req_tail_size)
-                    smb_req_length = len(smb_req_head) + smb_req_tail_size
-                    smb_req_net_bio = NBTSession(TYPE=0x00, LENGTH=smb_req_length)
-                    smb_req_tcp = inet.TCP(sport=sport, dport=SMBLib.smb_port, flags='PA', seq=attacker_seq,
-                                           ack=victim_seq)
-                    smb_req_ip = inet.IP(src=ip_source, dst=ip, ttl=source_ttl_value)
-                    smb_req_ether = inet.Ether(src=mac_source, dst=mac_destination)
-                    attacker_seq += len(smb_req_net_bio) + len(smb_req_head) + smb_req_tail_size
-
-                    smb_req_combined = (smb_req_ether / smb_req_ip / smb_req_tcp / smb_req_net_bio / smb_req_head)
-
-                    for i in range(0, len(smb_req_tail_arr)):
-                        smb_req_combined = smb_req_combined / smb_req_tail_arr[i]
-
-                    self.timestamp_controller.set_timestamp(timestamp_confirm)
-                    timestamp_smb_req = self.timestamp_controller.next_timestamp(min_delay)
-                    smb_req_combined.time = timestamp_smb_req
-                    self.add_packet(smb_req_combined, ip_source, ip)
-
-                    # destination confirms SMB request package
-                    reply_tcp = inet.TCP(sport=SMBLib.smb_port, dport=sport, seq=victim_seq, ack=attacker_seq,
-                                         window=destination_win_value, flags='A')
-                    confirm_smb_req = (reply_ether / reply_ip / reply_tcp)
-                    self.timestamp_controller.set_timestamp(timestamp_smb_req)
-                    timestamp_reply = self.timestamp_controller.next_timestamp(min_delay)
-                    confirm_smb_req.time = timestamp_reply
-                    self.add_packet(confirm_smb_req, ip_source, ip)
-
-                    # smb response package
-                    first_timestamp = time.mktime(time.strptime(first_timestamp_smb, "%Y-%m-%d %H:%M:%S"))
-                    server_guid, security_blob, capabilities, data_size, server_start_time =\
-                        SMBLib.get_smb_platform_data(self.host_os, first_timestamp)
-
-                    self.timestamp_controller.set_timestamp(timestamp_reply)
+                if ip in ip_data_map:
+                    destination_ip_data = ip_data_map[ip]
+                    min_delay, max_delay = reply_latency_map[ip]
+                else:
+                    # the destination was replaced by the IP of the given MAC address
+                    destination_ip_data = self.get_ip_data(ip)
+                    min_delay, max_delay = self.get_reply_latency(ip_source, ip)
+
+                target = {'ip': ip, 'mac_destination': mac_destination, 'destination_ip_data': destination_ip_data,
+                          'sport': sports[i], 'seqs': (int(tcp_seqs[i, 0]), int(tcp_seqs[i, 1])),
+                          'hosting': ip in hosting_ip_set}
+
+                # Every packet of the connection follows its predecessor by the reply latency
+                timestamps = [timestamp_next_pkt, self.timestamp_controller.next_timestamp(min_delay)]
+                if target['hosting']:
+                    target['smb_ids'] = (int(smb_ids[i, 0]), int(smb_ids[i, 1]))
+                    # ACK, SMB request and its ACK
+                    for _ in range(3):
+                        timestamps.append(self.timestamp_controller.next_timestamp(min_delay))
+                    timestamp_smb_req = timestamps[-2]
+
+                    target['smb_platform_data'] = SMBLib.get_smb_platform_data(self.host_os, first_timestamp)
+
                     timestamp_smb_rsp = self.timestamp_controller.next_timestamp(min_delay)
+                    timestamps.append(timestamp_smb_rsp)
                     diff = timestamp_smb_rsp - timestamp_smb_req
                     begin = Util.get_filetime_format(timestamp_smb_req + diff * 0.1)
                     end = Util.get_filetime_format(timestamp_smb_rsp - diff * 0.1)
-                    system_time = rnd.randint(begin, end)
-
-                    # Creation of SMB Negotiate Protocol Response packets
-                    if smb_version != "1" and hosting_version != "1":
-                        smb_rsp_packet = SMB2.SMB2_SYNC_Header(Flags=1)
-                        smb_rsp_negotiate_body =\
-                            SMB2.SMB2_Negotiate_Protocol_Response(DialectRevision=0x02ff, SecurityBufferOffset=124,
-                                                                  SecurityBufferLength=len(security_blob),
-                                                                  SecurityBlob=security_blob, Capabilities=capabilities,
-                                                                  MaxTransactSize=data_size, MaxReadSize=data_size,
-                                                                  MaxWriteSize=data_size, SystemTime=system_time,
-                                                                  ServerStartTime=server_start_time,
-                                                                  ServerGuid=server_guid)
-                        smb_rsp_length = len(smb_rsp_packet) + len(smb_rsp_negotiate_body)
-                    else:
-                        smb_rsp_packet =\
-                            SMBNegociate_Protocol_Response_Advanced_Security(Start="\xffSMB", PID=smb_pid, MID=smb_mid,
-                                                                             DialectIndex=5, SecurityBlob=security_blob)
-                        smb_rsp_length = len(smb_rsp_packet)
-                    smb_rsp_net_bio = NBTSession(TYPE=0x00, LENGTH=smb_rsp_length)
-                    smb_rsp_tcp = inet.TCP(sport=SMBLib.smb_port, dport=sport, flags='PA', seq=victim_seq,
-                                           ack=attacker_seq)
-                    smb_rsp_ip = inet.IP(src=ip, dst=ip_source, ttl=destination_ttl_value)
-                    smb_rsp_ether = inet.Ether(src=mac_destination, dst=mac_source)
-                    victim_seq += len(smb_rsp_net_bio) + len(smb_rsp_packet)
-                    if smb_version != "1" and hosting_version != "1":
-                        victim_seq += len(smb_rsp_negotiate_body)
-
-                    smb_rsp_combined = (smb_rsp_ether / smb_rsp_ip / smb_rsp_tcp / smb_rsp_net_bio / smb_rsp_packet)
-                    if smb_version != "1" and hosting_version != "1":
-                        smb_rsp_combined = (smb_rsp_combined / smb_rsp_negotiate_body)
-
-                    smb_rsp_combined.time = timestamp_smb_rsp
-                    self.add_packet(smb_rsp_combined, ip_source, ip)
-
-                    # source confirms SMB response package
-                    confirm_tcp = inet.TCP(sport=sport, dport=SMBLib.smb_port, seq=attacker_seq, ack=victim_seq,
-                                           window=source_win_value, flags='A')
-                    confirm_smb_res = (confirm_ether / confirm_ip / confirm_tcp)
-                    self.timestamp_controller.set_timestamp(timestamp_smb_rsp)
-                    timestamp_confirm = self.timestamp_controller.next_timestamp(min_delay)
-                    confirm_smb_res.time = timestamp_confirm
-                    self.add_packet(confirm_smb_res, ip_source, ip)
-
-                    # attacker sends FIN ACK
-                    confirm_tcp = inet.TCP(sport=sport, dport=SMBLib.smb_port, seq=attacker_seq, ack=victim_seq,
-                                           window=source_win_value, flags='FA')
-                    source_fin_ack = (confirm_ether / confirm_ip / confirm_tcp)
-                    self.timestamp_controller.set_timestamp(timestamp_confirm)
-                    timestamp_src_fin_ack = self.timestamp_controller.next_timestamp(min_delay)
-                    source_fin_ack.time = timestamp_src_fin_ack
-                    attacker_seq += 1
-                    self.add_packet(source_fin_ack, ip_source, ip)
-
-                    # victim sends FIN ACK
-                    reply_tcp = inet.TCP(sport=SMBLib.smb_port, dport=sport, seq=victim_seq, ack=attacker_seq,
-                                         window=destination_win_value, flags='FA')
-                    destination_fin_ack = (reply_ether / reply_ip / reply_tcp)
-                    self.timestamp_controller.set_timestamp(timestamp_src_fin_ack)
-                    timestamp_dest_fin_ack = self.timestamp_controller.next_timestamp(min_delay)
-                    victim_seq += 1
-                    destination_fin_ack.time = timestamp_dest_fin_ack
-                    self.add_packet(destination_fin_ack, ip_source, ip)
-
-                    # source sends final ACK
-                    confirm_tcp = inet.TCP(sport=sport, dport=SMBLib.smb_port, seq=attacker_seq, ack=victim_seq,
-                                           window=source_win_value, flags='A')
-                    final_ack = (confirm_ether / confirm_ip / confirm_tcp)
-                    self.timestamp_controller.set_timestamp(timestamp_dest_fin_ack)
-                    timestamp_final_ack = self.timestamp_controller.next_timestamp(min_delay)
-                    final_ack.time = timestamp_final_ack
-                    self.add_packet(final_ack, ip_source, ip)
+                    target['system_time'] = rnd.randint(begin, end)
 
-                else:
-                    # Build RST package
-                    reply_ether = inet.Ether(src=mac_destination, dst=mac_source)
-                    reply_ip = inet.IP(src=ip, dst=ip_source, ttl=destination_ttl_value, flags='DF')
-                    reply_tcp = inet.TCP(sport=SMBLib.smb_port, dport=sport, seq=0, ack=attacker_seq, flags='RA',
-                                         window=destination_win_value, options=[('MSS', destination_mss_value)])
-                    reply = (reply_ether / reply_ip / reply_tcp)
-                    reply.time = timestamp_reply
-                    self.add_packet(reply, ip_source, ip)
+                    # ACK of the SMB response, both FIN ACKs and the final ACK
+                    for _ in range(4):
+                        timestamps.append(self.timestamp_controller.next_timestamp(min_delay))
+                target['timestamps'] = timestamps
+                targets.append(target)
 
             self.timestamp_controller.set_timestamp(timestamp_next_pkt)
             timestamp_next_pkt = self.timestamp_controller.next_timestamp()
 
+        # Build the packets of the targets in parallel, if it is worth spawning worker processes. Inside an attack
+        # worker of Controller.process_attacks the other cores are already busy with the other attacks.
+        build_target_packets = functools.partial(_build_target_packets, common)
+        workers = os.cpu_count() or 1
+        if workers > 1 and len(targets) >= _PARALLEL_MIN_TARGETS and not Util.IN_ATTACK_WORKER:
+            chunksize = max(1, len(targets) // (4 * workers))
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                target_packets = list(executor.map(build_target_packets, targets, chunksize=chunksize))
+        else:
+            target_packets = map(build_target_packets, targets)
+
+        self.target_run_starts = []
+        for target, packets in zip(targets, target_packets):
+            self.target_run_starts.append(len(self.packets))
+            for packet in packets:
+                self.add_packet(packet, ip_source, target['ip'])
+
     def generate_attack_pcap(self):
         """
         Creates a pcap containing the attack packets.
@@ -447,9 +572,17 @@ class SMBScanAttack(BaseAttack.BaseAttack):
         """
         # store end time of attack
         self.attack_end_utime = self.packets[-1].time
+        packet_count = len(self.packets)
+
+        # the packets of every single target are generated in chronological order, so merging these runs is
+        # sufficient to sort all packets. The merge is consumed by the pcap writer packet by packet, no sorted copy of
+        # all packets is kept in memory. The timestamps are plain floats, so they are compared without conversion.
+        run_bounds = self.target_run_starts + [len(self.packets)]
+        runs = [itertools.islice(self.packets, run_bounds[i], run_bounds[i + 1]) for i in range(len(run_bounds) - 1)]
 
         # write attack self.packets to pcap
-        pcap_path = self.write_attack_pcap(sorted(self.packets, key=lambda pkt: pkt.time))
+        pcap_path = self.write_attack_pcap(heapq.merge(*runs, key=operator.attrgetter('time')))
+        self.reset_packets()
 
         # return packets sorted by packet time_sec_start
-        return len(self.packets), pcap_path
+        return packet_count, pcap_path
@@ -1,7 +1,13 @@
+import bisect
+import concurrent.futures
+import contextlib
+import io
+import itertools
+import multiprocessing
 import os
 import readline
+import sqlite3
 import sys
-import shutil
 import time
 import re
 
@@ -13,6 +19,132 @@ import Lib.PcapFile as PcapFile
 import Lib.Utility as Util
 import Core.StatsDatabase as StatsDB
 
+# the help texts of the query mode by keyword, each printed with a single print call
+_HELP_TEXTS = {
+    "": "\n".join([
+        "Query mode allows you to enter SQL-queries as well as named queries.",
+        "",
+        "Named queries:",
+        "\tSelectors:",
+        "\t\tmost_used(...)  -> Returns the most occurring element in all elements",
+        "\t\tleast_used(...) -> Returns the least occurring element in all elements",
+        "\t\tavg(...)        -> Returns the average of all elements",
+        "\t\tall(...)        -> Returns all elements",
+        "\tExtractors:",
+        "\t\trandom(...)     -> Returns a random element from a list",
+        "\t\tfirst(...)      -> Returns the first element from a list",
+        "\t\tlast(...)       -> Returns the last element from a list",
+        "\tParameterized selectors:",
+        "\t\tipAddress(...)  -> Returns all IP addresses fulfilling the specified conditions",
+        "\t\tmacAddress(...) -> Returns all MAC addresses fulfilling the specified conditions",
+        "",
+        "Miscellaneous:",
+        "\tlabels            -> List all attacks listed in the label file, if any",
+        "\ttables            -> List all tables from database",
+        "\tcolumns TABLE     -> List column names and types from specified table",
+        "",
+        "Additional information is available with 'help [KEYWORD];'",
+        "To get a list of examples, type 'help examples;'",
+        ""]),
+    "most_used": "\n".join([
+        "most_used can be used as a selector for the following attributes:",
+        "ipAddress | macAddress | portNumber | protocolName | ttlValue | mssValue | winSize | ipClass",
+        ""]),
+    "least_used": "\n".join([
+        "least_used can be used as a selector for the following attributes:",
+        "ipAddress | macAddress | portNumber | protocolName | ttlValue | mssValue | winSize | ipClass",
+        ""]),
+    "avg": "\n".join([
+        "avg can be used as a selector for the following attributes:",
+        "pktsReceived | pktsSent | kbytesSent | kbytesReceived | ttlValue | mss",
+        ""]),
+    "all": "\n".join([
+        "all can be used as a selector for the following attributes:",
+        "ipAddress | ttlValue | mss | macAddress | portNumber | protocolName | winSize | ipClass",
+        ""]),
+    "ipaddress": "\n".join([
+        "ipAddress is a parameterized selector which fetches IP addresses based on (a list of) conditions.",
+        "Conditions are of the following form: PARAMETER OPERATOR VALUE",
+        "The following parameters can be specified:",
+        "pktsReceived | pktsSent | kbytesReceived | kbytesSent | maxPktRate | minPktRate | ipClass",
+        "macAddress | ttlValue | ttlCount | portDirection | portNumber | portCount | protocolCount",
+        "protocolName",
+        "",
+        "The following operators can be used:",
+        "<= | < | = | >= | > | in",
+        "",
+        "A value can either be a simple values, a list of simple values separated by commas and enclosed "
+        "in [] brackets, or another query.",
+        "",
+        "When VALUE is a list (or a query returning a list), the usage of the 'in' operator is mandatory!",
+        "",
+        "See 'help examples;' for usage examples.",
+        ""]),
+    "macaddress": "\n".join([
+        "macAddress is a parameterized selector which fetches MAC addresses based on (a list of) conditions.",
+        "Conditions are of the following form: PARAMETER OPERATOR VALUE",
+        "The following parameters can be specified:",
+        "ipAddress",
+        "",
+        "See 'help ipAddress' for information on valid operators and values.",
+        "",
+        "See 'help examples;' for usage examples.",
+        ""]),
+    "examples": "\n".join([
+        "Get the average amount of sent packets per IP:",
+        "\tavg(pktsSent);",
+        "Get a random IP from all addresses occuring in the pcap:",
+        "\trandom(all(ipAddress));",
+        "Return the MAC address of a specified IP:",
+        "\tmacAddress(ipAddress=192.168.178.2);",
+        "Get the average TTL-value with SQL:",
+        "\tSELECT avg(ttlValue) from ip_ttl;",
+        "Get a random IP address from all addresses that sent and received at least 10 packets:",
+        "\trandom(ipAddress(pktsSent > 10, pktsReceived > 10));",
+        "Get the IP addresses used with one of the MAC addresses in a list:",
+        "\tipAddress(macAddress in [08:00:27:a3:83:43, 52:54:00:12:35:02]);",
+        ""])
+}
+_HELP_TEXTS["random"] = _HELP_TEXTS["first"] = _HELP_TEXTS["last"] = "No additional info available for this keyword.\n"
+
+# the AttackController of the Controller, which is inherited by the worker processes forked in process_attacks
+_worker_attack_controller = None
+
+
+def _run_forked_attack(attack: list, seed: int, measure_time: bool) -> tuple:
+    """
+    Generates a single attack in a worker process forked by Controller.process_attacks.
+
+    :param attack: The attack name followed by its attack parameters.
+    :param seed: The random seed for the attack.
+    :param measure_time: Measure time for packet generation.
+    :return: The path of the temporary attack pcap, the packet generation time, the number of generated packets, the
+    additional files, the labels and the printed output of the attack
+    """
+    attack_controller = _worker_attack_controller
+    # the attacks must not fork worker processes of their own, this process is already one of several workers
+    Util.IN_ATTACK_WORKER = True
+    # SQLite connections must not be used across a fork
+    attack_controller.statistics.stats_db.reconnect()
+    # only report the files and labels created by this attack back to the main process
+    attack_controller.additional_files = []
+    attack_controller.label_mgr.labels = []
+
+    attack_controller.set_seed(seed=seed)
+    # buffer the progress output, the main process prints it once the attack is done, so that the output of
+    # concurrently generated attacks does not interleave
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            temp_attack_pcap, duration = attack_controller.process_attack(attack[0], attack[1:], measure_time)
+    except BaseException as e:
+        # e.g. the SystemExit of invalid attack parameters, pass the buffered output (containing the error message) on
+        # to the main process along with the exception
+        e.attack_output = output.getvalue()
+        raise
+    return (temp_attack_pcap, duration, attack_controller.total_packets, attack_controller.additional_files,
+            attack_controller.label_mgr.labels, output.getvalue())
+
 
 class Controller:
     def __init__(self, pcap_file_path: str, do_extra_tests: bool, non_verbose: bool=True, pcap_out_path: str=None,
@@ -89,33 +221,61 @@ class Controller:
         :param inject_empty: if flag is set, Attack PCAPs will not be merged with the base PCAP, ie. Attacks are injected into an empty PCAP
         """
 
-        # load attacks sequentially
-        i = 0
-        for attack in attacks_config:
-            if seeds is not None and len(seeds) > i:
-                rng_seed = seeds[i][0]
-            else:
-                rng_seed = int.from_bytes(os.urandom(16), sys.byteorder)
-            self.attack_controller.set_seed(seed=rng_seed)
-            temp_attack_pcap, duration = self.attack_controller.process_attack(attack[0], attack[1:], measure_time)
+        # resolve the seeds up front, so every attack gets the same seed no matter in which process it is generated
+        given_seeds = [seed[0] for seed in seeds[:len(attacks_config)]] if seeds is not None else []
+        random_bytes = os.urandom(16 * (len(attacks_config) - len(given_seeds)))
+        rng_seeds = given_seeds + [int.from_bytes(random_bytes[i:i + 16], sys.byteorder)
+                                   for i in range(0, len(random_bytes), 16)]
+
+        workers = min(len(attacks_config), os.cpu_count() or 1)
+        if workers > 1 and multiprocessing.get_start_method() == "fork":
+            # generate the attacks in parallel, the forked worker processes inherit the loaded statistics
+            global _worker_attack_controller
+            _worker_attack_controller = self.attack_controller
+            results = []
+            try:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                    try:
+                        for result in executor.map(_run_forked_attack, attacks_config, rng_seeds,
+                                                   itertools.repeat(measure_time)):
+                            results.append(result)
+                            print(result[5], end="")
+                    except BaseException as e:
+                        # print the output of the failed attack before the exception ends the program, like the
+                        # sequential generation does
+                        print(getattr(e, "attack_output", ""), end="")
+                        raise
+
+                for _, _, _, additional_files, labels, _ in results:
+                    self.attack_controller.additional_files += additional_files
+                    self.label_manager.add_labels(tuple(labels))
+            finally:
+                _worker_attack_controller = None
+        else:
+            # load attacks sequentially
+            results = []
+            for attack, rng_seed in zip(attacks_config, rng_seeds):
+                self.attack_controller.set_seed(seed=rng_seed)
+                temp_attack_pcap, duration = self.attack_controller.process_attack(attack[0], attack[1:],
+                                                                                   measure_time)
+                results.append((temp_attack_pcap, duration, self.attack_controller.total_packets))
+
+        for i, (temp_attack_pcap, duration, total_packets, *_) in enumerate(results):
             self.durations.append(duration)
-            self.added_packets += self.attack_controller.total_packets
-            if not self.non_verbose:
-                self.statistics.stats_summary_post_attack(self.added_packets)
+            self.added_packets += total_packets
+            if not self.non_verbose and len(results) > 1:
+                print("Attack " + str(i + 1) + "/" + str(len(results)) + ": " + str(total_packets) + " packets added")
             self.written_pcaps.append(temp_attack_pcap)
-            i += 1
 
         attacks_pcap_path = None
 
         # merge attack pcaps to get single attack pcap
         if len(self.written_pcaps) > 1:
-            print("\nMerging temporary attack pcaps into single pcap file...", end=" ")
-            sys.stdout.flush()  # force python to print text immediately
-            for i in range(0, len(self.written_pcaps) - 1):
-                attacks_pcap = PcapFile.PcapFile(self.written_pcaps[i])
-                attacks_pcap_path = attacks_pcap.merge_attack(self.written_pcaps[i + 1])
-                os.remove(self.written_pcaps[i + 1])  # remove merged pcap
-                self.written_pcaps[i + 1] = attacks_pcap_path
+            print("\nMerging temporary attack pcaps into single pcap file...", end=" ", flush=True)
+            attacks_pcap = PcapFile.PcapFile(self.written_pcaps[0])
+            attacks_pcap_path = attacks_pcap.merge_attacks(self.written_pcaps[1:])
+            for written_pcap in self.written_pcaps:
+                os.remove(written_pcap)  # remove merged pcap
             print("done.")
         elif len(self.written_pcaps) == 1:
             attacks_pcap_path = self.written_pcaps[0]
@@ -123,19 +283,18 @@ class Controller:
         if attacks_pcap_path:
             if inject_empty:
                 # copy the attack pcap to the directory of the base PCAP instead of merging them
-                print("Copying single attack pcap to location of base pcap...", end=" ")
-                sys.stdout.flush()  # force python to print text immediately
+                print("Copying single attack pcap to location of base pcap...", end=" ", flush=True)
 
-                timestamp = '_' + time.strftime("%Y%m%d") + '-' + time.strftime("%X").replace(':', '')
-                if '.pcap' in self.pcap_src_path:
-                    self.pcap_dest_path = self.pcap_src_path.replace(".pcap", timestamp + '.pcap')
+                timestamp = '_' + time.strftime("%Y%m%d-%H%M%S")
+                stem, ext = os.path.splitext(self.pcap_src_path)
+                if ext == ".pcap":
+                    self.pcap_dest_path = stem + timestamp + ext
                 else:
                     self.pcap_dest_path = self.pcap_src_path + timestamp + '.pcap'
-                shutil.copy(attacks_pcap_path, self.pcap_dest_path)
+                Util.copy_file(attacks_pcap_path, self.pcap_dest_path)
             else:
                 # merge single attack pcap with all attacks into base pcap
-                print("Merging base pcap with single attack pcap...", end=" ")
-                sys.stdout.flush()  # force python to print text immediately
+                print("Merging base pcap with single attack pcap...", end=" ", flush=True)
                 self.pcap_dest_path = self.pcap_file.merge_attack(attacks_pcap_path)
 
             if self.pcap_out_path:
@@ -143,19 +302,18 @@ class Controller:
                     self.pcap_out_path += ".pcap"
                 result_path = self.pcap_out_path
             else:
-                tmp_path_tuple = self.pcap_dest_path.rpartition("/")
-                result_path = Util.OUT_DIR + tmp_path_tuple[2]
+                result_path = os.path.join(Util.OUT_DIR, os.path.basename(self.pcap_dest_path))
 
-            os.rename(self.pcap_dest_path, result_path)
+            os.replace(self.pcap_dest_path, result_path)
             self.pcap_dest_path = result_path
             self.created_files = [self.pcap_dest_path]
 
             # process/move other created files
-            pcap_basename = os.path.splitext(self.pcap_dest_path)[0]
-            for x in self.attack_controller.additional_files:
-                outpath = pcap_basename + "_" + x
-                os.rename(x, outpath)
-                self.created_files.append(outpath)
+            pcap_root = os.path.splitext(self.pcap_dest_path)[0] + "_"
+            renames = [(x, pcap_root + x) for x in self.attack_controller.additional_files]
+            for src, outpath in renames:
+                os.replace(src, outpath)
+            self.created_files.extend(outpath for _, outpath in renames)
 
             print("done.")
 
@@ -163,8 +321,7 @@ class Controller:
             if self.debug:
                 print('NOT deleting intermediate attack pcap while in debug mode.')
             else:
-                print('Deleting intermediate attack pcap...', end=" ")
-                sys.stdout.flush()  # force python to print text immediately
+                print('Deleting intermediate attack pcap...', end=" ", flush=True)
                 os.remove(attacks_pcap_path)
                 print("done.")
 
@@ -182,7 +339,7 @@ class Controller:
             print("--> No packets were injected. Therefore no output files were created.")
 
         # print summary statistics
-        if not self.non_verbose and len(attacks_config) != 1:
+        if not self.non_verbose:
             self.statistics.stats_summary_post_attack(self.added_packets)
 
     def process_db_queries(self, query, print_results=False):
@@ -207,97 +364,14 @@ class Controller:
         :param params: A list of parameters for the help command (can be empty).
         """
         if not params:
-            print("Query mode allows you to enter SQL-queries as well as named queries.")
-            print()
-            print("Named queries:")
-            print("\tSelectors:")
-            print("\t\tmost_used(...)  -> Returns the most occurring element in all elements")
-            print("\t\tleast_used(...) -> Returns the least occurring element in all elements")
-            print("\t\tavg(...)        -> Returns the average of all elements")
-            print("\t\tall(...)        -> Returns all elements")
-            print("\tExtractors:")
-            print("\t\trandom(...)     -> Returns a random element from a list")
-            print("\t\tfirst(...)      -> Returns the first element from a list")
-            print("\t\tlast(...)       -> Returns the last element from a list")
-            print("\tParameterized selectors:")
-            print("\t\tipAddress(...)  -> Returns all IP addresses fulfilling the specified conditions")
-            print("\t\tmacAddress(...) -> Returns all MAC addresses fulfilling the specified conditions")
-            print()
-            print("Miscellaneous:")
-            print("\tlabels            -> List all attacks listed in the label file, if any")
-            print("\ttables            -> List all tables from database")
-            print("\tcolumns TABLE     -> List column names and types from specified table")
-            print()
-            print("Additional information is available with 'help [KEYWORD];'")
-            print("To get a list of examples, type 'help examples;'")
-            print()
+            print(_HELP_TEXTS[""])
             return
 
         param = params[0].lower()
-        if param == "most_used":
-            print("most_used can be used as a selector for the following attributes:")
-            print("ipAddress | macAddress | portNumber | protocolName | ttlValue | mssValue | winSize | ipClass")
-            print()
-        elif param == "least_used":
-            print("least_used can be used as a selector for the following attributes:")
-            print("ipAddress | macAddress | portNumber | protocolName | ttlValue | mssValue | winSize | ipClass")
-            print()
-        elif param == "avg":
-            print("avg can be used as a selector for the following attributes:")
-            print("pktsReceived | pktsSent | kbytesSent | kbytesReceived | ttlValue | mss")
-            print()
-        elif param == "all":
-            print("all can be used as a selector for the following attributes:")
-            print("ipAddress | ttlValue | mss | macAddress | portNumber | protocolName | winSize | ipClass")
-            print()
-        elif param in ["random", "first", "last"]:
-            print("No additional info available for this keyword.")
-            print()
-        elif param == "ipaddress":
-            print("ipAddress is a parameterized selector which fetches IP addresses based on (a list of) conditions.")
-            print("Conditions are of the following form: PARAMETER OPERATOR VALUE")
-            print("The following parameters can be specified:")
-            print("pktsReceived | pktsSent | kbytesReceived | kbytesSent | maxPktRate | minPktRate | ipClass\n"
-                  "macAddress | ttlValue | ttlCount | portDirection | portNumber | portCount | protocolCount\n"
-                  "protocolName")
-            print()
-            print("The following operators can be used:")
-            print("<= | < | = | >= | > | in")
-            print()
-            print("A value can either be a simple values, a list of simple values separated by commas and enclosed "
-                  "in [] brackets, or another query.")
-            print()
-            print("When VALUE is a list (or a query returning a list), the usage of the 'in' operator is mandatory!")
-            print()
-            print("See 'help examples;' for usage examples.")
-            print()
-        elif param == "macaddress":
-            print("macAddress is a parameterized selector which fetches MAC addresses based on (a list of) conditions.")
-            print("Conditions are of the following form: PARAMETER OPERATOR VALUE")
-            print("The following parameters can be specified:")
-            print("ipAddress")
-            print()
-            print("See 'help ipAddress' for information on valid operators and values.")
-            print()
-            print("See 'help examples;' for usage examples.")
-            print()
-        elif param == "examples":
-            print("Get the average amount of sent packets per IP:")
-            print("\tavg(pktsSent);")
-            print("Get a random IP from all addresses occuring in the pcap:")
-            print("\trandom(all(ipAddress));")
-            print("Return the MAC address of a specified IP:")
-            print("\tmacAddress(ipAddress=192.168.178.2);")
-            print("Get the average TTL-value with SQL:")
-            print("\tSELECT avg(ttlValue) from ip_ttl;")
-            print("Get a random IP address from all addresses that sent and received at least 10 packets:")
-            print("\trandom(ipAddress(pktsSent > 10, pktsReceived > 10));")
-            print("Get the IP addresses used with one of the MAC addresses in a list:")
-            print("\tipAddress(macAddress in [08:00:27:a3:83:43, 52:54:00:12:35:02]);")
-            print()
+        if param in _HELP_TEXTS:
+            print(_HELP_TEXTS[param])
         else:
-            print("Unknown keyword '" + param + "', try 'help;' to get a list of allowed keywords'")
-            print()
+            print("Unknown keyword '" + param + "', try 'help;' to get a list of allowed keywords'\n")
 
     def internal_command(self, query: str) -> bool:
         # Strip off semicolon, split into command and parameters
@@ -343,7 +417,6 @@ class Controller:
             if not is_table:
                 print("Table " + params[0].lower() + " does not exist.")
                 return True
-            self.statisticsDB.process_db_query("SELECT * FROM " + params[0].lower(), False)
             columns = self.statisticsDB.get_field_types(params[0].lower())
             for column in columns:
                 print(column + ": " + columns[column])
@@ -359,19 +432,34 @@ class Controller:
 
         def make_completer(vocabulary):
             """
-            TODO: FILL ME
-            :param vocabulary:
-            :return:
+            Creates a readline completer for the given vocabulary.
+
+            :param vocabulary: the keywords to complete
+            :return: the completer function
             """
+            sorted_vocabulary = sorted(vocabulary)
+            cache_text = None
+            cache_matches = []
+
             def custom_template(text, state):
                 """
-                TODO: FILL ME
-                :param text:
-                :param state:
-                :return:
+                Returns the completion number state for text. readline calls this for state 0, 1, 2, ... until None is
+                returned, so the matches are only searched for the first state.
+
+                :param text: the text to complete
+                :param state: the number of the requested completion
+                :return: the completion or None, if there are no more completions
                 """
-                results = [x for x in vocabulary if x.startswith(text)] + [None]
-                return results[state]
+                nonlocal cache_text, cache_matches
+                if text != cache_text:
+                    # the keywords starting with text form a contiguous range of the sorted vocabulary
+                    lo = bisect.bisect_left(sorted_vocabulary, text)
+                    hi = bisect.bisect_left(sorted_vocabulary, text + "\uffff")
+                    cache_matches = sorted_vocabulary[lo:hi]
+                    cache_text = text
+                if state < len(cache_matches):
+                    return cache_matches[state]
+                return None
 
             return custom_template
 
@@ -383,6 +471,7 @@ class Controller:
             readline.read_history_file(history_file)
         except IOError:
             pass
+        history_length = readline.get_current_history_length()
         print("Entering into query mode...")
         print("Enter statement ending by ';' and press ENTER to send query. Exit by sending an empty query.")
         print("Type 'help;' for information on possible queries.")
@@ -391,9 +480,9 @@ class Controller:
             line = input("> ")
             if line == "":
                 break
-            buffer += line
-            import sqlite3
-            if sqlite3.complete_statement(buffer):
+            buffer += line + " "
+            # a statement can only be completed by a line containing its terminating semicolon
+            if ";" in line and sqlite3.complete_statement(buffer):
                 buffer = buffer.strip()
                 if not self.internal_command(buffer):
                     try:
@@ -412,8 +501,14 @@ class Controller:
                         sys.stderr.write(e.args[0] + "\n")
                 buffer = ""
 
-        readline.set_history_length(1000)
-        readline.write_history_file(history_file)
+        # append only the new entries, the whole history is rewritten to trim it once it holds twice the history length
+        max_history_length = 1000
+        if history_length and readline.get_current_history_length() <= 2 * max_history_length and \
+                hasattr(readline, "append_history_file"):
+            readline.append_history_file(readline.get_current_history_length() - history_length, history_file)
+        else:
+            readline.set_history_length(max_history_length)
+            readline.write_history_file(history_file)
 
         # Save the label file, in case content has changed
         self.label_manager.write_label_file(self.pcap_src_path)
@@ -424,8 +519,8 @@ class Controller:
         """
         print("Statistical plots are being generated", end="", flush=True)
         if params is not None and params[0] is not None:
-            # FIXME: cleanup
-            params_dict = dict([z.split("=") for z in params])
-            self.statistics.plot_statistics(entropy=entropy, file_format=params_dict['format'])
+            # parameters are given as KEY=VALUE, values may contain '=' themselves
+            params_dict = dict(z.partition("=")[::2] for z in params)
+            self.statistics.plot_statistics(entropy=entropy, file_format=params_dict.get('format', 'pdf'))
         else:
             self.statistics.plot_statistics(entropy=entropy)
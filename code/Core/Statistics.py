@@ -891,6 +891,65 @@ class Statistics(object):
         result_dict = {key: value for (key, value) in result}
         return result_dict
 
+    def get_ttl_distributions(self, ip_addresses: list):
+        """
+        :param ip_addresses: the IP addresses of which the TTL distributions shall be returned
+        :return: a dict mapping every given IP address to its TTL distribution, as returned by get_ttl_distribution
+        """
+        return self._get_distributions("ttlValue", "ttlCount", "ip_ttl", ip_addresses)
+
+    def get_mss_distributions(self, ip_addresses: list):
+        """
+        :param ip_addresses: the IP addresses of which the MSS distributions shall be returned
+        :return: a dict mapping every given IP address to its MSS distribution, as returned by get_mss_distribution
+        """
+        return self._get_distributions("mssValue", "mssCount", "tcp_mss", ip_addresses)
+
+    def get_win_distributions(self, ip_addresses: list):
+        """
+        :param ip_addresses: the IP addresses of which the window size distributions shall be returned
+        :return: a dict mapping every given IP address to its window size distribution, as returned by
+                 get_win_distribution
+        """
+        return self._get_distributions("winSize", "winCount", "tcp_win", ip_addresses)
+
+    def _get_distributions(self, value_column: str, count_column: str, table: str, ip_addresses: list):
+        """
+        Retrieves the value distributions of several IP addresses with a single query.
+
+        :param value_column: the column containing the values
+        :param count_column: the column containing the number of occurrences of the values
+        :param table: the table to query
+        :param ip_addresses: the IP addresses of which the distributions shall be returned
+        :return: a dict mapping every given IP address to a dict of {value: count}
+        """
+        result_dict = {ip: {} for ip in ip_addresses}
+        if not ip_addresses:
+            return result_dict
+        result = self.get_ip_rows("ipAddress, " + value_column + ", " + count_column, table, ip_addresses)
+        for (ip, key, value) in result:
+            result_dict.setdefault(ip, {})[key] = value
+        return result_dict
+
+    def get_ip_rows(self, columns: str, table: str, ip_addresses: list):
+        """
+        Retrieves the rows of several IP addresses from a table. The IP addresses are bound as parameters of the query,
+        in chunks of at most 999, the maximum number of parameters of a statement before SQLite 3.32.
+
+        :param columns: the columns to select, e.g. "ipAddress, macAddress"
+        :param table: the table to query
+        :param ip_addresses: the IP addresses whose rows shall be returned
+        :return: a list of the selected rows of all given IP addresses
+        """
+        ip_addresses = list(ip_addresses)
+        rows = []
+        for i in range(0, len(ip_addresses), 999):
+            chunk = tuple(ip_addresses[i:i + 999])
+            placeholders = ", ".join(["?"] * len(chunk))
+            query = "SELECT " + columns + " FROM " + table + " WHERE ipAddress IN (" + placeholders + ")"
+            rows.extend(self.stats_db.process_db_query(query, False, chunk))
+        return rows
+
     def get_tos_distribution(self, ip_address: str):
         """
         TODO: FILL ME
@@ -947,8 +1006,7 @@ class Statistics(object):
         """
         :return: The MAC addresses used in the dataset for the given IP addresses as a dictionary.
         """
-        return dict(self.process_db_query("SELECT DISTINCT ipAddress, macAddress from ip_mac WHERE ipAddress in ("
-                                          + str(ip_addresses)[1:-1] + ")"))
+        return dict(self.get_ip_rows("DISTINCT ipAddress, macAddress", "ip_mac", ip_addresses))
 
     def get_mac_address(self, ip_address: str):
         """
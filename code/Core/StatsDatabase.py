@@ -1,5 +1,8 @@
+import functools
+import operator
 import os.path
 import random as rnd
+import re
 import typing
 import sqlite3
 import sys
@@ -16,13 +19,51 @@ def dict_gen(curs: sqlite3.Cursor):
     """
     field_names = [d[0] for d in curs.description]
     while True:
-        rows = curs.fetchmany()
+        # fetch in batches, the cursor's default arraysize returns a single row per call
+        rows = curs.fetchmany(256)
         if not rows:
             return
         for row in rows:
             yield dict(zip(field_names, row))
 
 
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a connection to the statistics database at db_path.
+
+    The connection caches the compiled statements of up to 256 distinct queries. The named queries, the internal queries
+    of Statistics and the attacks exceed sqlite3's default of 100 statements, which would evict and re-compile them.
+    The database is mostly read with aggregating queries, so the connection keeps up to 64 MiB of pages in its cache,
+    memory maps up to 256 MiB of the file and keeps temporary tables of sorts and groupings in memory.
+
+    :param db_path: The path to the database file
+    :return: the connection to the database
+    """
+    database = sqlite3.connect(db_path, cached_statements=256)
+    for pragma in ("cache_size=-65536", "mmap_size=268435456", "temp_store=MEMORY", "synchronous=NORMAL"):
+        database.execute("PRAGMA " + pragma)
+    return database
+
+
+# the open database connections by process ID and database path, shared by all StatsDatabase objects of a process
+_connections = {}
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """
+    Returns the connection of the current process to the statistics database at db_path and opens it on first use. The
+    connections are kept per process, because SQLite connections must not be carried across a fork.
+
+    :param db_path: The path to the database file
+    :return: the connection to the database
+    """
+    key = (os.getpid(), os.path.abspath(db_path))
+    database = _connections.get(key)
+    if database is None:
+        database = _connections[key] = connect(db_path)
+    return database
+
+
 class QueryExecutionException(Exception):
     pass
 
@@ -35,11 +76,18 @@ class StatsDatabase:
         :param db_path: The path to the database file
         """
         self.query_parser = qp.QueryParser()
+        # parsing with pyparsing is slow, so repeated named queries are parsed only once
+        self.parse_query = functools.lru_cache(maxsize=256)(self.query_parser.parse_query)
+        # matches queries containing any named query keyword
+        self.named_query_keywords_re = re.compile("|".join(map(re.escape, self.get_all_named_query_keywords())))
 
+        self.db_path = db_path
         self.existing_db = os.path.exists(db_path)
-        self.database = sqlite3.connect(db_path)
+        self.database = get_connection(db_path)
         self.cursor = self.database.cursor()
         self.current_interval_statistics_tables = []
+        # the field types by table name, see get_field_types
+        self.field_types = {}
 
         # If DB not existing, create a new DB scheme
         if self.existing_db:
@@ -50,6 +98,25 @@ class StatsDatabase:
         else:
             print('Statistics database not found. Creating new database at: ', db_path)
 
+    def reconnect(self):
+        """
+        Switches to the connection of the current process to the database. Must be called by a forked process before it
+        uses the database, because SQLite connections must not be carried across a fork.
+        """
+        self.database = get_connection(self.db_path)
+        self.cursor = self.database.cursor()
+
+    def _run(self, query: str, query_parameters: tuple = ()) -> list:
+        """
+        Executes a query on the cursor of the database and fetches all of its results. The query runs on self.cursor
+        instead of a new cursor, so its description stays available for printing the results.
+
+        :param query: The query to execute
+        :param query_parameters: The tuple of parameters to substitute for the '?' marks in the query
+        :return: the results of the query
+        """
+        return self.cursor.execute(query, query_parameters).fetchall()
+
     def get_file_info(self):
         """
         Retrieves general file statistics from the database. This includes:
@@ -81,8 +148,7 @@ class StatsDatabase:
         it should have to check whether the database is outdated and needs to be recreated.
         :return: True if the versions match, otherwise False
         """
-        self.cursor.execute('PRAGMA user_version;')
-        return self.cursor.fetchall()[0][0] != pr.pcap_processor.get_db_version()
+        return self._run('PRAGMA user_version;')[0][0] != pr.pcap_processor.get_db_version()
 
     @staticmethod
     def _get_selector_keywords():
@@ -147,10 +213,13 @@ class StatsDatabase:
         """
         dic = {}
         for table in table_names:
-            self.cursor.execute("PRAGMA table_info('%s')" % table)
-            results = self.cursor.fetchall()
-            for field in results:
-                dic[field[1].lower()] = field[2]
+            fields = self.field_types.get(table)
+            if fields is None:
+                fields = {field[1].lower(): field[2] for field in self._run("PRAGMA table_info('%s')" % table)}
+                # tables are only cached once they exist, the statistics may not have been written yet
+                if fields:
+                    self.field_types[table] = fields
+            dic.update(fields)
         return dic
 
     def get_current_interval_statistics_table(self):
@@ -176,9 +245,12 @@ class StatsDatabase:
         :param current_intervals: a list of current intervals in seconds, first of which should be used for internal
                                   calculations
         """
+        default_table_name = None
         for current_interval in current_intervals:
             if current_interval == 0.0:
-                table_name = self.process_db_query("SELECT name FROM interval_tables WHERE is_default=1")
+                if default_table_name is None:
+                    default_table_name = self.process_db_query("SELECT name FROM interval_tables WHERE is_default=1")
+                table_name = default_table_name
                 if table_name != []:
                     substr = "Using default interval: " + str(float(table_name[len("interval_statistics_"):])/1000000) \
                              + "s"
@@ -207,9 +279,10 @@ class StatsDatabase:
                          "AND ip_statistics.ipAddress=ip_protocols.ipAddress WHERE ",
             "macaddress": "SELECT DISTINCT macAddress from ip_mac WHERE "}
         query = named_queries.get(keyword)
-        field_types = self.get_field_types('ip_mac', 'ip_ttl', 'ip_ports', 'ip_protocols', 'ip_statistics', 'ip_mac')
         conditions = []
+        query_parameters = []
         for key, op, value in param_op_val:
+            subquery = None
             # Check whether the value is not a simple value, but another query (or list)
             if isinstance(value, pp.ParseResults):
                 if value[0] == "list":
@@ -220,33 +293,34 @@ class StatsDatabase:
                     if op != "in":
                         raise QueryExecutionException("List values require the usage of the 'in' operator!")
                 else:
-                    # If we have another query instead of a direct value, execute and replace it
-                    rvalue = self._execute_query_list(value)
-
                     # Do we have a comparison operator with a multiple-result query?
                     if op != "in" and value[0] in ['most_used', 'least_used', 'all', 'ipaddress_param',
-                                                       'macaddress_param']:
+                                                   'macaddress_param']:
                         raise QueryExecutionException("The extractor '" + value[0] +
                                                       "' may return more than one result!")
 
-                    # Make value contain a simple list with the results of the query
-                    value = map(lambda x: str(x[0]), rvalue)
+                    # Plain named queries are embedded as subqueries and evaluated together with this query
+                    if value[0] in self._get_selector_keywords():
+                        subquery = self.named_queries.get(value[0] + "." + value[1])
+
+                    if subquery is None:
+                        # If we have another query instead of a direct value, execute and replace it
+                        rvalue = self._execute_query_list(value)
+
+                        # Make value contain a simple list with the results of the query
+                        value = map(lambda x: str(x[0]), rvalue)
             else:
                 # Make sure value is a list now to simplify handling
                 value = [value]
 
-            # this makes sure that TEXT fields are queried by strings,
-            # e.g. ipAddress=192.168.178.1 --is-converted-to--> ipAddress='192.168.178.1'
-            if field_types.get(key) == 'TEXT':
-                def ensure_string(x):
-                    if not str(x).startswith("'") and not str(x).startswith('"'):
-                        return "'" + x + "'"
-                    else:
-                        return x
-                value = map(ensure_string, value)
-
-            # If we have more than one value, join them together, separated by commas
-            value = ",".join(map(str, value))
+            if subquery is not None:
+                value = subquery
+            else:
+                # Bind the values as parameters, SQLite converts them to the type of the field they are compared with,
+                # e.g. ipAddress=192.168.178.1 is queried as a string and ttlValue=64 as a number
+                value = list(map(str, value))
+                query_parameters.extend(value)
+                value = ",".join("?" * len(value))
 
             # this replacement is required to remove ambiguity in SQL query
             if key == 'ipAddress':
@@ -255,8 +329,7 @@ class StatsDatabase:
 
         where_clause = " AND ".join(conditions)
         query += where_clause
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        return self._run(query, tuple(query_parameters))
 
     named_queries = {
         "most_used.ipaddress": "SELECT ipAddress FROM ip_statistics WHERE (pktsSent+pktsReceived) == "
@@ -320,6 +393,44 @@ class StatsDatabase:
         "all.winsize": "SELECT DISTINCT winSize FROM tcp_win ORDER BY winSize ASC",
         "all.ipclass": "SELECT DISTINCT ipClass FROM ip_statistics ORDER BY ipClass ASC"}
 
+    # Window functions (SQLite 3.25 and later) find the most and least used values while grouping the table once,
+    # instead of grouping it a second time for the count to compare with
+    if sqlite3.sqlite_version_info >= (3, 25, 0):
+        named_queries.update({
+            "most_used.macaddress": "SELECT macAddress FROM (SELECT macAddress, COUNT(*) AS occ, MAX(COUNT(*)) OVER () "
+                                    "AS ext FROM ip_mac GROUP BY macAddress) WHERE occ=ext ORDER BY macAddress ASC",
+            "most_used.portnumber": "SELECT portNumber FROM (SELECT portNumber, COUNT(portNumber) AS occ, "
+                                    "MAX(COUNT(portNumber)) OVER () AS ext FROM ip_ports GROUP BY portNumber) WHERE "
+                                    "occ=ext ORDER BY portNumber ASC",
+            "most_used.protocolname": "SELECT protocolName FROM (SELECT protocolName, COUNT(protocolCount) AS occ, "
+                                      "MAX(COUNT(protocolCount)) OVER () AS ext FROM ip_protocols GROUP BY "
+                                      "protocolName) WHERE occ=ext ORDER BY protocolName ASC",
+            "most_used.ttlvalue": "SELECT ttlValue FROM (SELECT ttlValue, SUM(ttlCount) AS occ, MAX(SUM(ttlCount)) "
+                                  "OVER () AS ext FROM ip_ttl GROUP BY ttlValue) WHERE occ=ext ORDER BY ttlValue ASC",
+            "most_used.mssvalue": "SELECT mssValue FROM (SELECT mssValue, SUM(mssCount) AS occ, MAX(SUM(mssCount)) "
+                                  "OVER () AS ext FROM tcp_mss GROUP BY mssValue) WHERE occ=ext ORDER BY mssValue ASC",
+            "most_used.winsize": "SELECT winSize FROM (SELECT winSize, SUM(winCount) AS occ, MAX(SUM(winCount)) "
+                                 "OVER () AS ext FROM tcp_win GROUP BY winSize) WHERE occ=ext ORDER BY winSize ASC",
+            "most_used.ipclass": "SELECT ipClass FROM (SELECT ipClass, COUNT(*) AS occ, MAX(COUNT(*)) OVER () AS ext "
+                                 "FROM ip_statistics GROUP BY ipClass) WHERE occ=ext ORDER BY ipClass ASC",
+            "least_used.macaddress": "SELECT macAddress FROM (SELECT macAddress, COUNT(*) AS occ, MIN(COUNT(*)) "
+                                     "OVER () AS ext FROM ip_mac GROUP BY macAddress) WHERE occ=ext ORDER BY "
+                                     "macAddress ASC",
+            "least_used.portnumber": "SELECT portNumber FROM (SELECT portNumber, COUNT(portNumber) AS occ, "
+                                     "MIN(COUNT(portNumber)) OVER () AS ext FROM ip_ports GROUP BY portNumber) WHERE "
+                                     "occ=ext ORDER BY portNumber ASC",
+            "least_used.protocolname": "SELECT protocolName FROM (SELECT protocolName, COUNT(protocolCount) AS occ, "
+                                       "MIN(COUNT(protocolCount)) OVER () AS ext FROM ip_protocols GROUP BY "
+                                       "protocolName) WHERE occ=ext ORDER BY protocolName ASC",
+            "least_used.ttlvalue": "SELECT ttlValue FROM (SELECT ttlValue, SUM(ttlCount) AS occ, MIN(SUM(ttlCount)) "
+                                   "OVER () AS ext FROM ip_ttl GROUP BY ttlValue) WHERE occ=ext ORDER BY ttlValue ASC",
+            "least_used.mssvalue": "SELECT mssValue FROM (SELECT mssValue, SUM(mssCount) AS occ, MIN(SUM(mssCount)) "
+                                   "OVER () AS ext FROM tcp_mss GROUP BY mssValue) WHERE occ=ext ORDER BY mssValue ASC",
+            "least_used.winsize": "SELECT winSize FROM (SELECT winSize, SUM(winCount) AS occ, MIN(SUM(winCount)) "
+                                  "OVER () AS ext FROM tcp_win GROUP BY winSize) WHERE occ=ext ORDER BY winSize ASC",
+            "least_used.ipclass": "SELECT ipClass FROM (SELECT ipClass, COUNT(*) AS occ, MIN(COUNT(*)) OVER () AS ext "
+                                  "FROM ip_statistics GROUP BY ipClass) WHERE occ=ext ORDER BY ipClass ASC"})
+
     def _execute_query_list(self, query_list):
         """
         Recursively executes a list of named queries. They are of the following form:
@@ -342,10 +453,8 @@ class StatsDatabase:
             if query is None:
                 raise QueryExecutionException("The requested query '" + query_list[0] + "(" + query_list[1] +
                                               ")' was not found in the internal query list!")
-            self.cursor.execute(str(query))
             # TODO: fetch query on demand
-            last_result = self.cursor.fetchall()
-            return last_result
+            return self._run(query)
 
     def process_db_query(self, query_string_in: str, print_results=False, sql_query_parameters: tuple = None):
         """
@@ -356,20 +465,18 @@ class StatsDatabase:
         :param sql_query_parameters: Parameters for the SQL query (optional)
         :return: the results of the query
         """
-        named_query_keywords = self.get_all_named_query_keywords()
-
         # Clean query_string
         query_string = query_string_in.lower().lstrip()
 
         # query_string is a user-defined SQL query
         result = None
-        if sql_query_parameters is not None or query_string.startswith("select") or query_string.startswith("insert"):
+        if sql_query_parameters is not None or query_string.startswith(("select", "insert")):
             result = self.process_user_defined_query(query_string, sql_query_parameters)
         # query string is a named query -> parse it and pass it to statisticsDB
-        elif any(k in query_string for k in named_query_keywords) and all(k in query_string for k in ['(', ')']):
+        elif self.named_query_keywords_re.search(query_string) and "(" in query_string and ")" in query_string:
             if query_string[-1] != ";":
                 query_string += ";"
-            query_list = self.query_parser.parse_query(query_string)
+            query_list = self.parse_query(query_string)
             result = self._execute_query_list(query_list)
         else:
             sys.stderr.write(
@@ -377,19 +484,15 @@ class StatsDatabase:
             return
 
         # If result is tuple/list with single element, extract value from list
-        requires_extraction = (isinstance(result, list) or isinstance(result, tuple)) and len(result) == 1 and \
-                              (not isinstance(result[0], tuple) or len(result[0]) == 1)
-
-        while requires_extraction:
-            if isinstance(result, list) or isinstance(result, tuple):
-                result = result[0]
-            else:
-                requires_extraction = False
+        while isinstance(result, (list, tuple)) and len(result) == 1 and \
+                (not isinstance(result[0], tuple) or len(result[0]) == 1):
+            result = result[0]
 
         # If tuple of tuples or list of tuples, each consisting of single element is returned,
         # then convert it into list of values, because the returned column is clearly specified by the given query
-        if (isinstance(result, tuple) or isinstance(result, list)) and all(len(val) == 1 for val in result):
-            result = [c for c in result for c in c]
+        if isinstance(result, (list, tuple)) and self.cursor.description is not None and \
+                len(self.cursor.description) == 1:
+            result = list(map(operator.itemgetter(0), result))
 
         # Print results if option print_results is True
         if print_results:
@@ -435,26 +538,26 @@ class StatsDatabase:
         # Print query results
         if query_string_in.lstrip().upper().startswith(
                 "SELECT") and result is not None and self.cursor.description is not None:
-            widths = []
-            columns = []
+            columns = [cd[0] for cd in self.cursor.description]
+            widths = [len(column) for column in columns]
             tavnit = '|'
             separator = '+'
-            for index, cd in enumerate(self.cursor.description):
-                max_col_length = 0
-                if len(result) > 0:
-                    max_col_length = max(list(map(lambda x:
-                                                  len(str(x[index] if len(self.cursor.description) > 1 else x)),
-                                                  result)))
-                widths.append(max(len(cd[0]), max_col_length))
-                columns.append(cd[0])
+            # single column results are a list of values instead of a list of rows
+            if len(columns) > 1:
+                for row in result:
+                    for index, value in enumerate(row):
+                        width = len(str(value))
+                        if width > widths[index]:
+                            widths[index] = width
+            elif result:
+                widths[0] = max(widths[0], max(len(str(value)) for value in result))
             for w in widths:
                 tavnit += " %-" + "%ss |" % (w,)
                 separator += '-' * w + '--+'
-            print(separator)
-            print(tavnit % tuple(columns))
-            print(separator)
-            for row in result:
-                print(tavnit % row)
-            print(separator)
+            # write the whole table at once instead of printing row by row
+            lines = [separator, tavnit % tuple(columns), separator]
+            lines.extend(tavnit % row for row in result)
+            lines.append(separator)
+            print("\n".join(lines))
         else:
             print(result)
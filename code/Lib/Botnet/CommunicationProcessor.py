@@ -1,5 +1,5 @@
-from lea import Lea
-from random import randrange
+from operator import itemgetter
+from random import getrandbits, random, randrange
 from Lib.Botnet.Message import Message
 from Lib.Botnet.Message import MessageType
 
@@ -24,6 +24,7 @@ class CommunicationProcessor:
         self.local_init_ids = dict()
         self.local_ids = dict()
         self.external_ids = set()
+        self._srcs, self._dsts, self._types, self._times, self._linenos = [], [], [], [], []
 
     def set_mapping(self, packets: list, mapped_ids: dict):
         """
@@ -34,6 +35,25 @@ class CommunicationProcessor:
         """
         self.packets = packets
         self.local_init_ids = set(mapped_ids)
+        # split the packets into one column per attribute, so that det_id_roles_and_msgs does not have to do
+        # dict lookups and type conversions for every single packet
+        self._srcs = list(map(itemgetter("Src"), packets))
+        self._dsts = list(map(itemgetter("Dst"), packets))
+        self._types = list(map(int, map(itemgetter("Type"), packets)))
+        self._times = list(map(float, map(itemgetter("Time"), packets)))
+        self._linenos = [packet.get("LineNumber", -1) for packet in packets]
+
+    def set_mapping_columns(self, columns: dict, mapped_ids: dict):
+        """
+        Set the selected mapping for this communication processor, with the packets given column-wise.
+
+        :param columns: all packets contained in the mapped time frame as one list per attribute, as returned by
+                        get_message_columns of the C++ communication processor
+        :param mapped_ids: the chosen IDs
+        """
+        self.local_init_ids = set(mapped_ids)
+        self._srcs, self._dsts, self._types = columns["Src"], columns["Dst"], columns["Type"]
+        self._times, self._linenos = columns["Time"], columns["LineNumber"]
 
     @staticmethod
     def get_comm_interval(cpp_comm_proc, strategy: str, number_ids: int, max_int_time: int, start_idx: int,
@@ -41,6 +61,8 @@ class CommunicationProcessor:
         """
         Finds a communication interval with respect to the given strategy. The interval is maximum of the given seconds 
         and has at least number_ids communicating initiators in it.
+        The C++ search of the optimal strategy runs without holding the GIL, so other Python threads keep running
+        meanwhile. They must not change the messages of cpp_comm_proc (e.g. via parse_csv) until it returns.
         
         :param cpp_comm_proc: An instance of the C++ communication processor that stores all the input messages and 
                               is responsible for retrieving the interval(s)
@@ -55,13 +77,8 @@ class CommunicationProcessor:
         """
 
         if strategy == "random":
-            # try finding not-empty interval 5 times
-            for i in range(5):
-                start_idx = randrange(0, cpp_comm_proc.get_message_count())
-                interval = cpp_comm_proc.find_interval_from_startidx(start_idx, number_ids, max_int_time)
-                if interval and interval["IDs"]:
-                    return interval
-            return {}
+            # try finding not-empty interval 5 times, seeding the C++ generator from the (seeded) Python one
+            return cpp_comm_proc.find_random_nonempty_interval(number_ids, max_int_time, 5, getrandbits(32))
         elif strategy == "optimal":
             intervals = cpp_comm_proc.find_optimal_interval(number_ids, max_int_time)
             if not intervals:
@@ -107,6 +124,15 @@ class CommunicationProcessor:
         """
 
         mtypes = self.mtypes
+        # the integer codes of requests, replies and timeouts, so that packets can be dispatched without
+        # converting (and hashing) their enum type first
+        request_types = frozenset((MessageType.SALITY_HELLO.value, MessageType.SALITY_NL_REQUEST.value))
+        reply_types = frozenset((MessageType.SALITY_HELLO_REPLY.value, MessageType.SALITY_NL_REPLY.value))
+        timeout_type = MessageType.TIMEOUT.value
+        # the types of the replies created for timeouts
+        nl_request, nl_reply, hello_reply = (MessageType.SALITY_NL_REQUEST, MessageType.SALITY_NL_REPLY,
+                                             MessageType.SALITY_HELLO_REPLY)
+        nat = self.nat
         # setup initial variables and their values
         respnd_ids = set()
         # msgs --> the filtered messages, msg_id --> an increasing ID to give every message an artificial primary key
@@ -121,74 +147,70 @@ class CommunicationProcessor:
         external_init_ids = set()
 
         # process every packet individually 
-        for packet in self.packets:
-            id_src, id_dst, msg_type, time = packet["Src"], packet["Dst"], int(packet["Type"]), float(packet["Time"])
-            lineno = packet.get("LineNumber", -1)
+        for id_src, id_dst, msg_type, time, lineno in zip(self._srcs, self._dsts, self._types, self._times,
+                                                          self._linenos):
+            # look up the locality of both IDs only once per packet
+            src_local, dst_local = id_src in local_init_ids, id_dst in local_init_ids
             # if if either one of the IDs is not mapped, continue
-            if (id_src not in local_init_ids) and (id_dst not in local_init_ids):
+            if not src_local and not dst_local:
                 continue
 
-            # convert message type number to enum type
-            msg_type = mtypes[msg_type]
-
             # process a request
-            if msg_type in {MessageType.SALITY_HELLO, MessageType.SALITY_NL_REQUEST}:
-                if not self.nat and id_dst in local_init_ids and id_src not in local_init_ids:
+            if msg_type in request_types:
+                if not nat and dst_local and not src_local:
                     external_init_ids.add(id_src)
-                elif id_src not in local_init_ids:
+                elif not src_local:
                     continue
                 else:
                     # process ID's role
                     respnd_ids.add(id_dst)
                 # convert the abstract message into a message object to handle it better
-                msg_str = "{0}-{1}".format(id_src, id_dst)
-                msg = Message(msg_id, id_src, id_dst, msg_type, time, line_no=lineno)
+                msg_key = (id_src, id_dst)
+                msg = Message(msg_id, id_src, id_dst, mtypes[msg_type], time, line_no=lineno)
                 msgs.append(msg)
-                prev_reqs[msg_str] = msg_id
+                prev_reqs[msg_key] = msg_id
                 msg_id += 1
                 req_seen = True
 
             # process a reply
-            elif msg_type in {MessageType.SALITY_HELLO_REPLY, MessageType.SALITY_NL_REPLY} and req_seen:
-                if not self.nat and id_src in local_init_ids and id_dst not in local_init_ids:
+            elif msg_type in reply_types and req_seen:
+                if not nat and src_local and not dst_local:
                     # process ID's role
                     external_init_ids.add(id_dst)
-                elif id_dst not in local_init_ids:
+                elif not dst_local:
                     continue
                 else: 
                     # process ID's role
                     respnd_ids.add(id_src)
                 # convert the abstract message into a message object to handle it better
-                msg_str = "{0}-{1}".format(id_dst, id_src)
-                # find the request message ID for this response and set its reference index
-                refer_idx = prev_reqs.get(msg_str, -1)
+                msg_key = (id_dst, id_src)
+                # find (and remove) the request message ID for this response and set its reference index
+                refer_idx = prev_reqs.pop(msg_key, -1)
                 if refer_idx != -1:
                     msgs[refer_idx].refer_msg_id = msg_id
-                    del(prev_reqs[msg_str])
-                msg = Message(msg_id, id_src, id_dst, msg_type, time, refer_idx, lineno)
+                msg = Message(msg_id, id_src, id_dst, mtypes[msg_type], time, refer_idx, lineno)
                 msgs.append(msg)
-                # remove the request to this response from storage
                 msg_id += 1
 
-            elif msg_type == MessageType.TIMEOUT and id_src in local_init_ids and not self.nat:
+            elif msg_type == timeout_type and src_local and not nat:
                 # convert the abstract message into a message object to handle it better
-                msg_str = "{0}-{1}".format(id_dst, id_src)
-                # find the request message ID for this response and set its reference index
-                refer_idx = prev_reqs.get(msg_str)
+                msg_key = (id_dst, id_src)
+                # find (and remove) the request message ID for this response and set its reference index
+                refer_idx = prev_reqs.pop(msg_key, None)
                 if refer_idx is not None:
                     msgs[refer_idx].refer_msg_id = msg_id
-                    if msgs[refer_idx].type == MessageType.SALITY_NL_REQUEST:
-                        msg = Message(msg_id, id_src, id_dst, MessageType.SALITY_NL_REPLY, time, refer_idx, lineno)
+                    if msgs[refer_idx].type == nl_request:
+                        msg = Message(msg_id, id_src, id_dst, nl_reply, time, refer_idx, lineno)
                     else:
-                        msg = Message(msg_id, id_src, id_dst, MessageType.SALITY_HELLO_REPLY, time, refer_idx, lineno)
+                        msg = Message(msg_id, id_src, id_dst, hello_reply, time, refer_idx, lineno)
                     msgs.append(msg)
-                    # remove the request to this response from storage
-                    del(prev_reqs[msg_str])
                     msg_id += 1
 
         # store the retrieved information in this object for later use
+        # the responders are sorted, as det_ext_and_local_ids draws their localities in this order, the external
+        # initiators are only needed as set
         self.respnd_ids = sorted(respnd_ids)
-        self.external_init_ids = sorted(external_init_ids)
+        self.external_init_ids = external_init_ids
         self.messages = msgs
 
         # return the selected messages
@@ -200,24 +222,17 @@ class CommunicationProcessor:
 
         :param prob_rspnd_local: the probabilty that a responder is local
         """
-        external_ids = set()
+        external_ids = set(self.external_init_ids)
         local_ids = self.local_init_ids.copy()
-        
-        # set up probabilistic chooser
-        rspnd_locality = Lea.fromValFreqsDict({"local": prob_rspnd_local*100, "external": (1-prob_rspnd_local)*100})
-
-        for id_ in self.external_init_ids:
-            external_ids.add(id_)
 
-        # determine responder localities
+        # determine responder localities, a plain coin flip per responder that has no locality yet
         for id_ in self.respnd_ids:
             if id_ in local_ids or id_ in external_ids:
-                continue 
-            
-            pos = rspnd_locality.random() 
-            if pos == "local":
+                continue
+
+            if random() < prob_rspnd_local:
                 local_ids.add(id_)
-            elif pos == "external":
+            else:
                 external_ids.add(id_)
 
         self.local_ids, self.external_ids = local_ids, external_ids
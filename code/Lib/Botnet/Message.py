@@ -29,6 +29,8 @@ class MessageType(Enum):
 
 class Message:
     INVALID_LINENO = -1
+    # no per-instance __dict__, as one message object is created for every mapped packet
+    __slots__ = ("msg_id", "src", "dst", "type", "time", "csv_time", "refer_msg_id", "line_no")
 
     """
     Defines a compact message type that contains all necessary information.
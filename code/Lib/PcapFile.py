@@ -25,6 +25,17 @@ class PcapFile(object):
         file_out_path = pcap.merge_pcaps(attack_pcap_path)
         return file_out_path
 
+    def merge_attacks(self, attack_pcap_paths: list):
+        """
+        Merges the loaded PCAP with all PCAPs at attack_pcap_paths in a single pass.
+
+        :param attack_pcap_paths: The paths to the PCAP files to merge with the PCAP at pcap_file_path
+        :return: The file path of the resulting PCAP file
+        """
+        pcap = pr.pcap_processor(self.pcap_file_path, "False", Util.RESOURCE_DIR, "")
+        file_out_path = pcap.merge_multiple_pcaps(attack_pcap_paths)
+        return file_out_path
+
     def get_file_hash(self):
         """
         Returns the hash for the loaded PCAP file. The hash is calculated based on:
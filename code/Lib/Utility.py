@@ -4,6 +4,8 @@ import ipaddress
 import Lib.libcpputils as cpputils
 import os
 import random as rnd
+import shutil
+import sys
 import lea
 import xdg.BaseDirectory as BaseDir
 import scapy.layers.inet as inet
@@ -16,6 +18,8 @@ ROOT_DIR = CODE_DIR + "../"
 RESOURCE_DIR = ROOT_DIR + "resources/"
 TEST_DIR = RESOURCE_DIR + "test/"
 OUT_DIR = None
+# set in the worker processes that Controller.process_attacks forks to generate several attacks in parallel
+IN_ATTACK_WORKER = False
 BOTNET_PCAP = RESOURCE_DIR + "2017-11-23_win16_cut_bot_udp.pcap"
 
 # List of common operation systems
@@ -398,3 +402,28 @@ def get_botnet_pcap_db():
     bot_stats.create_new_db(bot_pcap, True, False, True, [], False, False)
 
     return bot_pcap.get_db_path()
+
+
+def copy_file(src: str, dst: str):
+    """
+    Copies the file at src to dst including its permission bits. On Linux the data is copied within the kernel by
+    os.sendfile, without passing through user space buffers. Raises an OSError if the copy ends short.
+
+    :param src: the path of the file to copy
+    :param dst: the path of the copy
+    """
+    if not sys.platform.startswith("linux"):
+        shutil.copy(src, dst)
+        return
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+            if sent == 0:
+                # the source file was truncated while being copied, do not leave a partial copy behind as complete
+                raise OSError("Copying " + src + " to " + dst + " stopped after " + str(offset) + " of " + str(size) +
+                              " bytes")
+            offset += sent
+    shutil.copymode(src, dst)
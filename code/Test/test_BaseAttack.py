@@ -1,6 +1,11 @@
+import random
 import unittest
+import unittest.mock as mock
 
 import Attack.BaseAttack as BAtk
+import Attack.SMBScanAttack as SMBScan
+import Core.Controller as Ctrl
+import Lib.TestLibrary as Lib
 
 from Attack.Parameter import MACAddress, IPAddress
 
@@ -50,3 +55,58 @@ class TestBaseAttack(unittest.TestCase):
         for mac in mac_list:
             with self.subTest(mac=mac):
                 self.assertTrue(MACAddress._is_mac_address(mac))
+
+
+class TestBaseAttackBulkQueries(unittest.TestCase):
+    # IPs of the reference pcap and one IP that does not occur in it
+    ip_src = "10.0.2.15"
+    ip_dsts = ["104.83.103.45", "172.217.23.142", "192.168.33.254", "52.85.173.182", "192.168.178.5"]
+
+    @classmethod
+    def setUpClass(cls):
+        controller = Ctrl.Controller(pcap_file_path=Lib.test_pcap, do_extra_tests=False, non_verbose=True)
+        controller.load_pcap_statistics(flag_write_file=False, flag_recalculate_stats=False,
+                                        flag_print_statistics=False, intervals=[], delete=True)
+        # any attack will do, the bulk queries are implemented in BaseAttack
+        cls.attack = SMBScan.SMBScanAttack()
+
+    def test_get_ip_data_bulk(self):
+        random.seed(5)
+        bulk = self.attack.get_ip_data_bulk(self.ip_dsts)
+        random.seed(5)
+        single = {ip: self.attack.get_ip_data(ip) for ip in self.ip_dsts}
+        self.assertEqual(bulk, single)
+
+    def test_get_distributions(self):
+        statistics = self.attack.statistics
+        self.assertEqual(statistics.get_mss_distributions(self.ip_dsts),
+                         {ip: statistics.get_mss_distribution(ip) for ip in self.ip_dsts})
+        self.assertEqual(statistics.get_ttl_distributions(self.ip_dsts),
+                         {ip: statistics.get_ttl_distribution(ip) for ip in self.ip_dsts})
+        self.assertEqual(statistics.get_win_distributions(self.ip_dsts),
+                         {ip: statistics.get_win_distribution(ip) for ip in self.ip_dsts})
+
+    def test_get_reply_latency_bulk(self):
+        for mode in [None, "local", "public"]:
+            with self.subTest(mode=mode):
+                self.assertEqual(self.attack.get_reply_latency_bulk(self.ip_src, self.ip_dsts, mode=mode),
+                                 {ip: self.attack.get_reply_latency(self.ip_src, ip, mode=mode)
+                                  for ip in self.ip_dsts})
+
+    def test_get_reply_latency_bulk_default(self):
+        self.assertEqual(self.attack.get_reply_latency_bulk(self.ip_src, self.ip_dsts, default=1200),
+                         {ip: self.attack.get_reply_latency(self.ip_src, ip, default=1200) for ip in self.ip_dsts})
+
+    def test_get_reply_latency_bulk_zero_latency(self):
+        # the latencies of IPs with less than two packets are stored as 0
+        rows = [(self.ip_src, 0, 0), ("192.168.178.5", 0, 0)]
+        with mock.patch.object(self.attack.statistics, "get_ip_rows", return_value=rows):
+            with mock.patch.object(self.attack, "all_min_latencies", [100, 300]), \
+                    mock.patch.object(self.attack, "all_max_latencies", [400, 600]):
+                self.assertEqual(self.attack.get_reply_latency_bulk(self.ip_src, ["192.168.178.5"], mode="local"),
+                                 {"192.168.178.5": (200 * 10 ** -6, 500 * 10 ** -6)})
+            # without any conversation latencies the default latency is used
+            with mock.patch.object(self.attack, "all_min_latencies", []), \
+                    mock.patch.object(self.attack, "all_max_latencies", []):
+                self.assertEqual(self.attack.get_reply_latency_bulk(self.ip_src, ["192.168.178.5"], mode="local"),
+                                 {"192.168.178.5": (900 * 10 ** -6, 900 * 10 ** -6)})
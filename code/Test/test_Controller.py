@@ -1,6 +1,10 @@
+import contextlib
+import io
+import multiprocessing
 import unittest
 import unittest.mock as mock
 import Core.Controller as Ctrl
+import Lib.TestLibrary as Lib
 
 
 class TestController(unittest.TestCase):
@@ -58,3 +62,54 @@ class TestController(unittest.TestCase):
     def test_process_help_examples(self, mock_print):
         Ctrl.Controller.process_help(["examples"])
         self.assertTrue(mock_print.called)
+
+    @staticmethod
+    def run_attacks(attacks: list, seeds: list) -> tuple:
+        """
+        Injects the given attacks into the test pcap and removes the output files afterwards.
+
+        :return: the added packet count, the labels, the checksum of the result pcap and the checksums of the
+        additional files
+        """
+        controller = Ctrl.Controller(pcap_file_path=Lib.test_pcap, do_extra_tests=False, non_verbose=True)
+        controller.load_pcap_statistics(False, False, False, intervals=[], delete=True)
+        controller.process_attacks(attacks, seeds)
+
+        labels = [str(label) for label in controller.label_manager.labels]
+        pcap_checksum = Lib.get_sha256(controller.pcap_dest_path)
+        # the created files are the result pcap, the label file and the additional files
+        additional_checksums = [Lib.get_sha256(path) for path in controller.created_files[2:]]
+        Lib.clean_up(controller)
+        return controller.added_packets, labels, pcap_checksum, additional_checksums
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork",
+                         "the attacks are only generated in parallel with the fork start method")
+    def test_process_attacks_parallel_equals_sequential(self):
+        attacks = [['PortscanAttack'], ['SMBScanAttack', 'ip.src=192.168.178.1', 'ip.dst=192.168.178.5-192.168.178.10',
+                                        'hosting.ip=192.168.178.5'], ['P2PBotnet']]
+        seeds = [[5], [42], [1337]]
+
+        with mock.patch("os.cpu_count", return_value=len(attacks)):
+            parallel = self.run_attacks(attacks, seeds)
+        with mock.patch("multiprocessing.get_start_method", return_value="spawn"):
+            sequential = self.run_attacks(attacks, seeds)
+
+        self.assertGreater(parallel[0], 0)
+        self.assertEqual(len(parallel[1]), len(attacks))
+        self.assertEqual(len(parallel[3]), 1)  # the message mapping of P2PBotnet
+        self.assertEqual(parallel, sequential)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork",
+                         "the attacks are only generated in parallel with the fork start method")
+    def test_process_attacks_parallel_error_output(self):
+        attacks = [['PortscanAttack'], ['PortscanAttack', 'ip.src=192.168.178.1', 'ip.dst=192.168.178.1']]
+        controller = Ctrl.Controller(pcap_file_path=Lib.test_pcap, do_extra_tests=False, non_verbose=True)
+        controller.load_pcap_statistics(False, False, False, intervals=[], delete=True)
+
+        output = io.StringIO()
+        with mock.patch("os.cpu_count", return_value=len(attacks)), contextlib.redirect_stdout(output):
+            with self.assertRaises(SystemExit):
+                controller.process_attacks(attacks, [[5], [42]])
+
+        self.assertIn("ERROR: Invalid IP addresses; source IP is the same as destination IP", output.getvalue())
+        self.assertIsNone(Ctrl._worker_attack_controller)
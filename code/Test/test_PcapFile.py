@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import scapy.layers.inet as inet
+import scapy.layers.l2 as l2
+import scapy.utils as pcr
+from scapy.packet import Raw
+
+import Lib.PcapFile as PcapFile
+
+
+class TestPcapFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_pcap(self, name: str, packets: list) -> str:
+        """
+        Writes a pcap containing one UDP packet per (timestamp, payload) pair.
+
+        :return: the path of the written pcap
+        """
+        path = os.path.join(self.tmp_dir, name + ".pcap")
+        pkts = []
+        for timestamp, payload in packets:
+            pkt = l2.Ether() / inet.IP() / inet.UDP() / Raw(load=payload)
+            pkt.time = timestamp
+            pkts.append(pkt)
+        pcr.wrpcap(path, pkts)
+        return path
+
+    def test_merge_attacks_order(self):
+        base = self.write_pcap("base", [(1.0, b"a0"), (2.000002, b"a1"), (3.0, b"a2"), (5.0, b"a3")])
+        first = self.write_pcap("first", [(1.0, b"b0"), (2.000001, b"b1"), (5.0, b"b2")])
+        second = self.write_pcap("second", [(0.5, b"c0"), (3.0, b"c1"), (5.0, b"c2"), (6.0, b"c3")])
+
+        merged = PcapFile.PcapFile(base).merge_attacks([first, second])
+        payloads = [pkt[Raw].load for pkt in pcr.rdpcap(merged)]
+
+        # packets with equal timestamps are ordered by descending file index, as chained merge_pcaps calls would do
+        self.assertEqual(payloads, [b"c0", b"b0", b"a0", b"b1", b"a1", b"c1", b"a2", b"c2", b"b2", b"a3", b"c3"])
+
+    def test_merge_attacks_empty_attack(self):
+        base = self.write_pcap("base", [(1.0, b"a0"), (2.0, b"a1")])
+        empty = self.write_pcap("empty", [])
+
+        merged = PcapFile.PcapFile(base).merge_attacks([empty])
+        self.assertEqual([pkt[Raw].load for pkt in pcr.rdpcap(merged)], [b"a0", b"a1"])
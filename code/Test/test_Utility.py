@@ -1,4 +1,8 @@
+import os
+import sys
+import tempfile
 import unittest
+import unittest.mock as mock
 
 import Lib.TestLibrary as Lib
 import Lib.Utility as Utility
@@ -208,4 +212,29 @@ class TestUtility(unittest.TestCase):
     def test_remove_generic_ending_wrong_ending(self):
         self.assertEqual(Utility.remove_generic_ending("somestuff"), "somestuff")
 
+    def test_copy_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            src = os.path.join(tmp_dir, "src.pcap")
+            dst = os.path.join(tmp_dir, "dst.pcap")
+            content = os.urandom(100000)
+            with open(src, "wb") as f:
+                f.write(content)
+            os.chmod(src, 0o640)
+            Utility.copy_file(src, dst)
+            with open(dst, "rb") as f:
+                self.assertEqual(f.read(), content)
+            self.assertEqual(os.stat(dst).st_mode, os.stat(src).st_mode)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "os.sendfile is only used on Linux")
+    def test_copy_file_short_copy(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            src = os.path.join(tmp_dir, "src.pcap")
+            dst = os.path.join(tmp_dir, "dst.pcap")
+            with open(src, "wb") as f:
+                f.write(os.urandom(100000))
+            # the copy stops early, as if the source file had been truncated meanwhile
+            with mock.patch("os.sendfile", side_effect=[4096, 0]):
+                with self.assertRaises(OSError):
+                    Utility.copy_file(src, dst)
+
     # TODO: get_attacker_config Tests
@@ -205,6 +205,38 @@ py::list botnet_comm_processor::get_messages(unsigned int start_idx, unsigned in
     return py_messages;
 }
 
+/**
+ * Retrieves all messages contained in the interval between start_idx and end_idx in Python representation,
+ * with one (python) list per message attribute instead of one (python) dict per message.
+ * @param start_idx The inclusive first index of the interval.
+ * @param end_idx The inclusive last index of the interval.
+ * @return A (Python) dict (keys: 'Src', 'Dst', 'Type', 'Time', 'LineNumber') of (Python) lists, where the i-th entry
+ * of every list belongs to the i-th message of the interval.
+ */
+py::dict botnet_comm_processor::get_message_columns(unsigned int start_idx, unsigned int end_idx){
+    std::size_t count = 0;
+    if (start_idx < messages.size() && start_idx <= end_idx)
+        count = std::min<std::size_t>(end_idx, messages.size() - 1) - start_idx + 1;
+
+    py::list py_srcs(count), py_dsts(count), py_types(count), py_times(count), py_line_nos(count);
+    for (std::size_t i = 0; i < count; i++){
+        const abstract_msg &msg = messages[start_idx + i];
+        py_srcs[i] = msg.src;
+        py_dsts[i] = msg.dst;
+        py_types[i] = msg.type;
+        py_times[i] = msg.time;
+        py_line_nos[i] = msg.line_no;
+    }
+
+    py::dict py_columns;
+    py_columns["Src"] = py_srcs;
+    py_columns["Dst"] = py_dsts;
+    py_columns["Type"] = py_types;
+    py_columns["Time"] = py_times;
+    py_columns["LineNumber"] = py_line_nos;
+    return py_columns;
+}
+
 /**
  * Finds the time interval(s) of maximum the given seconds with the most overall communication
  * (i.e. requests and responses) that has at least number_ids communicating initiators in it. 
@@ -214,43 +246,49 @@ py::list botnet_comm_processor::get_messages(unsigned int start_idx, unsigned in
  * list of initiator IDs, a start index and an end index. The indices are with respect to the first abstract message.
  */
 py::list botnet_comm_processor::find_optimal_interval(int number_ids, double max_int_time){
-    unsigned int logical_thread_count = std::thread::hardware_concurrency();
-    std::vector<std::thread> threads;
-    std::vector<std::future<std::vector<comm_interval> > > futures;
-
-    // create as many threads as can run concurrently and assign them respective sections
-    for (std::size_t i = 0; i < logical_thread_count; i++){
-        unsigned int start_idx = (i * messages.size() / logical_thread_count);
-        unsigned int end_idx = (i + 1) * messages.size() / logical_thread_count;
-        std::promise<std::vector<comm_interval> > p;  // use promises to retrieve return values
-        futures.push_back(p.get_future());
-        threads.push_back(std::thread(&botnet_comm_processor::find_optimal_interval_helper, this, std::move(p), number_ids, max_int_time, start_idx, end_idx));
-    }
+    std::vector<comm_interval> possible_intervals;
 
-    // synchronize all threads
-    for (auto &t : threads){
-        t.join();
-    }
+    {
+        // the search does not touch any Python objects, so let other Python threads run meanwhile
+        py::gil_scoped_release release;
+
+        unsigned int logical_thread_count = std::thread::hardware_concurrency();
+        std::vector<std::thread> threads;
+        std::vector<std::future<std::vector<comm_interval> > > futures;
+
+        // create as many threads as can run concurrently and assign them respective sections
+        for (std::size_t i = 0; i < logical_thread_count; i++){
+            unsigned int start_idx = (i * messages.size() / logical_thread_count);
+            unsigned int end_idx = (i + 1) * messages.size() / logical_thread_count;
+            std::promise<std::vector<comm_interval> > p;  // use promises to retrieve return values
+            futures.push_back(p.get_future());
+            threads.push_back(std::thread(&botnet_comm_processor::find_optimal_interval_helper, this, std::move(p), number_ids, max_int_time, start_idx, end_idx));
+        }
 
-    // accumulate results
-    std::vector<std::vector<comm_interval> > acc_possible_intervals;
-    for (auto &f : futures){
-        acc_possible_intervals.push_back(f.get());
-    }
+        // synchronize all threads
+        for (auto &t : threads){
+            t.join();
+        }
 
-    // find overall most communicative interval
-    std::vector<comm_interval> possible_intervals;
-    unsigned int cur_highest_sum = 0;
-    for (const auto &single_poss_interval : acc_possible_intervals){
-        if (single_poss_interval.size() > 0 && single_poss_interval[0].comm_sum >= cur_highest_sum){
-            // if there is more than one interval, all of them have the same comm_sum
-            if (single_poss_interval[0].comm_sum > cur_highest_sum){
-                cur_highest_sum = single_poss_interval[0].comm_sum;
-                possible_intervals.clear();
-            }
+        // accumulate results
+        std::vector<std::vector<comm_interval> > acc_possible_intervals;
+        for (auto &f : futures){
+            acc_possible_intervals.push_back(f.get());
+        }
 
-            for (const auto &interval : single_poss_interval){
-                possible_intervals.push_back(std::move(interval));
+        // find overall most communicative interval
+        unsigned int cur_highest_sum = 0;
+        for (const auto &single_poss_interval : acc_possible_intervals){
+            if (single_poss_interval.size() > 0 && single_poss_interval[0].comm_sum >= cur_highest_sum){
+                // if there is more than one interval, all of them have the same comm_sum
+                if (single_poss_interval[0].comm_sum > cur_highest_sum){
+                    cur_highest_sum = single_poss_interval[0].comm_sum;
+                    possible_intervals.clear();
+                }
+
+                for (const auto &interval : single_poss_interval){
+                    possible_intervals.push_back(std::move(interval));
+                }
             }
         }
     }
@@ -275,6 +313,7 @@ void botnet_comm_processor::find_optimal_interval_helper(std::promise<std::vecto
     unsigned int cur_highest_sum = 0;  // the highest communication sum seen so far
     double cur_int_time = 0;  // the time of the current interval
     std::deque<unsigned int> init_ids;  // the initiator IDs seen in the current interval in order of appearance
+    std::unordered_map<unsigned int, unsigned int> init_id_counts;  // how often each initiator ID is in init_ids
     std::vector<comm_interval> possible_intervals;  // all intervals that have cur_highest_sum of communication and contain enough IDs
 
     // Iterate over all messages from start to finish and process the info of each message.
@@ -286,23 +325,20 @@ void botnet_comm_processor::find_optimal_interval_helper(std::promise<std::vecto
         // if current interval time exceeds maximum time period or all messages have been processed, 
         // process information of the current interval
         if (greater_than(cur_int_time, max_int_time) || idx_high >= messages.size()){
-            std::set<unsigned int> interval_ids;
-
-            for (std::size_t i = 0; i < init_ids.size(); i++) 
-                interval_ids.insert(init_ids[i]);
+            // if the interval contains enough initiator IDs and at least as much communication as the best ones,
+            // add it to possible_intervals (the ID set is only built for such intervals)
+            if (init_id_counts.size() >= (unsigned int) number_ids && comm_sum >= cur_highest_sum){
+                std::set<unsigned int> interval_ids;
+                for (const auto &id_count : init_id_counts)
+                    interval_ids.insert(id_count.first);
 
-            // if the interval contains enough initiator IDs, add it to possible_intervals
-            if (interval_ids.size() >= (unsigned int) number_ids){
                 comm_interval interval = {interval_ids, comm_sum, idx_low, idx_high - 1};
                 // reset possible intervals if new maximum of communication is found
                 if (comm_sum > cur_highest_sum){
                     possible_intervals.clear();
-                    possible_intervals.push_back(std::move(interval));
                     cur_highest_sum = comm_sum;
                 }
-                // append otherwise
-                else if (comm_sum == cur_highest_sum)
-                    possible_intervals.push_back(std::move(interval));
+                possible_intervals.push_back(std::move(interval));
             }
 
             // stop if all messages have been processed
@@ -320,6 +356,9 @@ void botnet_comm_processor::find_optimal_interval_helper(std::promise<std::vecto
             // of this message from the initiator list and update comm_sum
             if (cur_msg.type != TIMEOUT){
                 comm_sum--;
+                auto id_count = init_id_counts.find(init_ids.front());
+                if (--id_count->second == 0)
+                    init_id_counts.erase(id_count);
                 init_ids.pop_front();
             }
 
@@ -332,11 +371,13 @@ void botnet_comm_processor::find_optimal_interval_helper(std::promise<std::vecto
         // if message is request, add src to initiator list
         if (msgtype_is_request(cur_msg.type)){
             init_ids.push_back(cur_msg.src);
+            init_id_counts[cur_msg.src]++;
             comm_sum++;
         }
         // if message is response, add dst to initiator list
         else if (msgtype_is_response(cur_msg.type)){
             init_ids.push_back(cur_msg.dst);
+            init_id_counts[cur_msg.dst]++;
             comm_sum++;
         }
 
@@ -470,6 +511,34 @@ py::dict botnet_comm_processor::find_interval_from_endidx(int end_idx, int numbe
     }
 }
 
+/**
+ * Finds the time interval of maximum the given seconds starting at a randomly chosen index. Up to max_tries start
+ * indices are drawn until an interval with at least number_ids (and at least one) communicating initiators is found.
+ * @param number_ids The number of initiator IDs that have to exist in the interval.
+ * @param max_int_time The maximum time period of the interval.
+ * @param max_tries The maximum number of start indices to try.
+ * @param seed The seed for the generator the start indices are drawn with.
+ * @return A (python) dict (keys: 'IDs', Start', 'End'), which represents an interval with its list of initiator IDs,
+ * a start index and an end index. If no such interval is found, an empty dict is returned.
+ */
+py::dict botnet_comm_processor::find_random_nonempty_interval(int number_ids, double max_int_time, int max_tries, unsigned int seed){
+    py::dict comm_interval_py;  // the communication interval that is returned
+
+    if (messages.empty()){
+        return comm_interval_py;
+    }
+
+    std::mt19937 gen(seed);
+    std::uniform_int_distribution<int> start_idx_dist(0, messages.size() - 1);
+
+    for (int i = 0; i < max_tries; i++){
+        comm_interval_py = find_interval_from_startidx(start_idx_dist(gen), number_ids, max_int_time);
+        if (comm_interval_py.contains("IDs") && py::len(comm_interval_py["IDs"]) > 0)
+            return comm_interval_py;
+    }
+    return py::dict();
+}
+
 /**
  * Finds all initiator IDs contained in the interval spanned by the two indices.
  * @param start_idx The start index of the interval.
@@ -558,9 +627,11 @@ PYBIND11_MODULE (libbotnetcomm, m) {
             .def(py::init<>())
             .def("find_interval_from_startidx", &botnet_comm_processor::find_interval_from_startidx)
             .def("find_interval_from_endidx", &botnet_comm_processor::find_interval_from_endidx)
+            .def("find_random_nonempty_interval", &botnet_comm_processor::find_random_nonempty_interval)
             .def("find_optimal_interval", &botnet_comm_processor::find_optimal_interval)
             .def("get_interval_init_ids", &botnet_comm_processor::get_interval_init_ids)
             .def("get_messages", &botnet_comm_processor::get_messages)
+            .def("get_message_columns", &botnet_comm_processor::get_message_columns)
             .def("get_message_count", &botnet_comm_processor::get_message_count)
             .def("parse_csv", &botnet_comm_processor::parse_csv)
             .def("parse_xml", &botnet_comm_processor::parse_xml)
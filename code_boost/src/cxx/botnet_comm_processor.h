@@ -12,11 +12,13 @@
 #include <thread>
 #include <deque>
 #include <set>
+#include <unordered_map>
 #include <future>
 #include <fstream>
 #include <string>
 #include <istream>
 #include <iomanip>
+#include <random>
 
 
 /*
@@ -106,12 +108,16 @@ public:
 
     py::dict find_interval_from_endidx(int end_idx, int number_ids, double max_int_time);
 
+    py::dict find_random_nonempty_interval(int number_ids, double max_int_time, int max_tries, unsigned int seed);
+
     py::list find_optimal_interval(int number_ids, double max_int_time);
 
     py::list get_interval_init_ids(int start_idx, int end_idx);
 
     py::list get_messages(unsigned int start_idx, unsigned int end_idx);
 
+    py::dict get_message_columns(unsigned int start_idx, unsigned int end_idx);
+
     int get_message_count();
 
     unsigned int parse_csv(const std::string &filepath);
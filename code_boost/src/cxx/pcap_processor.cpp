@@ -38,11 +38,10 @@ long double pcap_processor::get_timestamp_mu_sec(const int after_packet_number)
 }
 
 /**
- * Merges two PCAP files, given by paths in filePath and parameter pcap_path.
- * @param pcap_path The path to the file which should be merged with the loaded PCAP file.
- * @return The string containing the file path to the merged PCAP file.
+ * Builds the path of a merged PCAP file by appending the current time to the filename of the loaded PCAP file.
+ * @return The path for the merged PCAP file.
  */
-std::string pcap_processor::merge_pcaps(const std::string pcap_path) {
+std::string pcap_processor::get_merged_filepath() {
     // Build new filename with timestamp
     // Build timestamp
     time_t curr_time = time(0);
@@ -68,6 +67,16 @@ std::string pcap_processor::merge_pcaps(const std::string pcap_path) {
     else {
         new_filepath = (new_filepath.substr(0, new_filepath.find('_'))).append(newExt);
     }
+    return new_filepath;
+}
+
+/**
+ * Merges two PCAP files, given by paths in filePath and parameter pcap_path.
+ * @param pcap_path The path to the file which should be merged with the loaded PCAP file.
+ * @return The string containing the file path to the merged PCAP file.
+ */
+std::string pcap_processor::merge_pcaps(const std::string pcap_path) {
+    std::string new_filepath = get_merged_filepath();
 
     FileSniffer sniffer_base(filePath);
     SnifferIterator iterator_base = sniffer_base.begin();
@@ -114,6 +123,56 @@ std::string pcap_processor::merge_pcaps(const std::string pcap_path) {
     return new_filepath;
 }
 
+/**
+ * Merges the loaded PCAP file with all PCAP files given by pcap_paths in a single pass, so every packet is read and
+ * written exactly once. Packets with equal timestamps are written in the reverse order of their files, as chained calls
+ * of merge_pcaps would do.
+ * @param pcap_paths The paths to the files which should be merged with the loaded PCAP file.
+ * @return The string containing the file path to the merged PCAP file.
+ */
+std::string pcap_processor::merge_multiple_pcaps(const py::list& pcap_paths) {
+    std::string new_filepath = get_merged_filepath();
+
+    std::vector<std::string> paths = {filePath};
+    for (auto pcap_path: pcap_paths) {
+        paths.push_back(pcap_path.cast<std::string>());
+    }
+
+    // Timestamp in microseconds and negated file index of the current packet of every file with remaining packets
+    typedef std::pair<long long, long> queue_entry;
+    std::priority_queue<queue_entry, std::vector<queue_entry>, std::greater<queue_entry>> next_packets;
+    std::vector<std::unique_ptr<FileSniffer>> sniffers;
+    std::vector<SnifferIterator> iterators;
+
+    auto timestamp_mu_sec = [](const Packet &pkt) {
+        return static_cast<long long>(pkt.timestamp().seconds()) * 1000000 + pkt.timestamp().microseconds();
+    };
+
+    for (std::size_t i = 0; i < paths.size(); i++) {
+        sniffers.emplace_back(new FileSniffer(paths[i]));
+        iterators.push_back(sniffers[i]->begin());
+        if (iterators[i] != sniffers[i]->end())
+            next_packets.emplace(timestamp_mu_sec(*iterators[i]), -static_cast<long>(i));
+    }
+
+    PacketWriter writer(new_filepath, PacketWriter::ETH2);
+
+    while (!next_packets.empty()) {
+        auto i = static_cast<std::size_t>(-next_packets.top().second);
+        next_packets.pop();
+        try {
+            writer.write(*iterators[i]);
+        } catch (serialization_error&) {
+            std::cerr << "Could not serialize packet of " << paths[i] << " with timestamp " << std::setprecision(15)
+                      << timestamp_mu_sec(*iterators[i]) * 1e-6 << std::endl;
+        }
+        iterators[i]++;
+        if (iterators[i] != sniffers[i]->end())
+            next_packets.emplace(timestamp_mu_sec(*iterators[i]), -static_cast<long>(i));
+    }
+    return new_filepath;
+}
+
 bool pcap_processor::read_pcap_info(const std::string &filePath, std::size_t &totalPakets) {
     // libtins has a lot of overhead when just iterating through, so we use libpcap directly
     char errbuf[PCAP_ERRBUF_SIZE];
@@ -490,6 +549,7 @@ PYBIND11_MODULE (libpcapreader, m) {
     py::class_<pcap_processor>(m, "pcap_processor")
             .def(py::init<std::string, std::string, std::string, std::string>())
             .def("merge_pcaps", &pcap_processor::merge_pcaps)
+            .def("merge_multiple_pcaps", &pcap_processor::merge_multiple_pcaps)
             .def("collect_statistics", &pcap_processor::collect_statistics)
             .def("get_timestamp_mu_sec", &pcap_processor::get_timestamp_mu_sec)
             .def("write_to_database", &pcap_processor::write_to_database)
@@ -9,7 +9,9 @@
 #include <iomanip>
 #include <tins/tins.h>
 #include <iostream>
+#include <memory>
 #include <pybind11/pybind11.h>
+#include <queue>
 #include <time.h>
 #include <stdio.h>
 #include <sys/stat.h>
@@ -48,8 +50,12 @@ public:
 
     long double get_timestamp_mu_sec(const int after_packet_number);
 
+    std::string get_merged_filepath();
+
     std::string merge_pcaps(const std::string pcap_path);
 
+    std::string merge_multiple_pcaps(const py::list& pcap_paths);
+
     bool read_pcap_info(const std::string &filePath, std::size_t &totalPakets);
 
     void collect_statistics(py::list& intervals);
@@ -162,7 +162,8 @@ void statistics_db::writeStatisticsTTL(const std::unordered_map<ipAddress_ttl, i
                 "ttlValue INTEGER,"
                 "ttlCount INTEGER,"
                 "PRIMARY KEY(ipAddress,ttlValue));"
-                "CREATE INDEX ipAddressTTL ON ip_ttl(ipAddress);";
+                "CREATE INDEX ipAddressTTL ON ip_ttl(ipAddress);"
+                "CREATE INDEX ttlValueTTL ON ip_ttl(ttlValue, ttlCount);";
         db->exec(createTable);
         SQLite::Statement query(*db, "INSERT INTO ip_ttl VALUES (?, ?, ?)");
         for (auto it = ttlDistribution.begin(); it != ttlDistribution.end(); ++it) {
@@ -195,7 +196,8 @@ void statistics_db::writeStatisticsMSS(const std::unordered_map<ipAddress_mss, i
                 "mssValue INTEGER,"
                 "mssCount INTEGER,"
                 "PRIMARY KEY(ipAddress,mssValue));"
-                "CREATE INDEX ipAddressMSS ON tcp_mss(ipAddress);";
+                "CREATE INDEX ipAddressMSS ON tcp_mss(ipAddress);"
+                "CREATE INDEX mssValueMSS ON tcp_mss(mssValue, mssCount);";
         db->exec(createTable);
         SQLite::Statement query(*db, "INSERT INTO tcp_mss VALUES (?, ?, ?)");
         for (auto it = mssDistribution.begin(); it != mssDistribution.end(); ++it) {
@@ -260,7 +262,8 @@ void statistics_db::writeStatisticsWin(const std::unordered_map<ipAddress_win, i
                 "winSize INTEGER,"
                 "winCount INTEGER,"
                 "PRIMARY KEY(ipAddress,winSize));"
-                "CREATE INDEX ipAddressWIN ON tcp_win(ipAddress);";
+                "CREATE INDEX ipAddressWIN ON tcp_win(ipAddress);"
+                "CREATE INDEX winSizeWIN ON tcp_win(winSize, winCount);";
         db->exec(createTable);
         SQLite::Statement query(*db, "INSERT INTO tcp_win VALUES (?, ?, ?)");
         for (auto it = winDistribution.begin(); it != winDistribution.end(); ++it) {
@@ -330,7 +333,8 @@ void statistics_db::writeStatisticsPorts(const std::unordered_map<ipAddress_inOu
                 "byteCount REAL,"
                 "portProtocol TEXT COLLATE NOCASE,"
                 "portService TEXT COLLATE NOCASE,"
-                "PRIMARY KEY(ipAddress,portDirection,portNumber,portProtocol));";
+                "PRIMARY KEY(ipAddress,portDirection,portNumber,portProtocol));"
+                "CREATE INDEX portNumberPorts ON ip_ports(portNumber);";
         db->exec(createTable);
         SQLite::Statement query(*db, "INSERT INTO ip_ports VALUES (?, ?, ?, ?, ?, ?, ?)");
         for (auto it = portsStatistics.begin(); it != portsStatistics.end(); ++it) {
@@ -372,7 +376,8 @@ void statistics_db::writeStatisticsIpMac(const std::unordered_map<std::string, s
         const char *createTable = "CREATE TABLE ip_mac ("
                 "ipAddress TEXT,"
                 "macAddress TEXT COLLATE NOCASE,"
-                "PRIMARY KEY(ipAddress));";
+                "PRIMARY KEY(ipAddress));"
+                "CREATE INDEX macAddressMAC ON ip_mac(macAddress);";
         db->exec(createTable);
         SQLite::Statement query(*db, "INSERT INTO ip_mac VALUES (?, ?)");
         for (auto it = IpMacStatistics.begin(); it != IpMacStatistics.end(); ++it) {